@@ -1,10 +1,34 @@
-from .main import frequency_analyzer, pressure_analyzer, oxygen_analyzer
-from .process import frequency_process, pressure_process, oxygen_process
+from .main import (
+    frequency_analyzer,
+    pressure_analyzer,
+    oxygen_analyzer,
+    reset_analyzers,
+    save_snapshot,
+    load_snapshot,
+    is_steady,
+)
+from .process import (
+    analyze_block,
+    analyze_frequency,
+    analyze_pressure,
+    analyze_oxygen,
+    frequency_process,
+    pressure_process,
+    oxygen_process,
+)
 
 __all__ = [
     "frequency_analyzer",
     "pressure_analyzer",
     "oxygen_analyzer",
+    "reset_analyzers",
+    "save_snapshot",
+    "load_snapshot",
+    "is_steady",
+    "analyze_block",
+    "analyze_frequency",
+    "analyze_pressure",
+    "analyze_oxygen",
     "frequency_process",
     "pressure_process",
     "oxygen_process",
@@ -1,48 +1,152 @@
-from common import calculate_mean, calculate_standard_deviation, get_current_timestamp
+import os
+import struct
+import threading
+from common import RollingWindow, now_ns
 
-frequency_history = []
-pressure_history = []
-oxygen_history = []
+WINDOW_SIZE = 30
 
+# Snapshot file: header, then per window its history, patient, count, position and values
+SNAPSHOT_MAGIC = b"TP1W"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<4sBHI")
+SNAPSHOT_WINDOW = struct.Struct("<BqHH")
+
+# Windows are kept per patient: patient_id -> RollingWindow
+window_size = WINDOW_SIZE
+frequency_history = {}
+systolic_history = {}
+diastolic_history = {}
+oxygen_history = {}
+
+# Snapshots copy the windows from another thread: add writes count before the new
+# value, so a copy in between could restore a stale slot. Adds and copies take this lock
+window_lock = threading.Lock()
+
+
+def reset_analyzers(size=WINDOW_SIZE):
+    global window_size
+    window_size = size
+    frequency_history.clear()
+    systolic_history.clear()
+    diastolic_history.clear()
+    oxygen_history.clear()
+
+
+def get_histories():
+    return (frequency_history, systolic_history, diastolic_history, oxygen_history)
+
+
+def copy_window(window):
+    with window_lock:
+        return window.count, window.position, window.values[:]
+
+
+def save_snapshot(path):
+    """Write every window of this process to path, atomically replacing the previous snapshot"""
+    windows = []
+    for history_id, history in enumerate(get_histories()):
+        for patient_id, window in list(history.items()):
+            windows.append((history_id, patient_id, *copy_window(window)))
+
+    values_record = struct.Struct(f"<{window_size}d")
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, window_size, len(windows)))
+        for history_id, patient_id, count, position, values in windows:
+            f.write(SNAPSHOT_WINDOW.pack(history_id, patient_id, count, position))
+            f.write(values_record.pack(*values))
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path):
+    """Restore the windows saved by save_snapshot, returns how many were restored.
+
+    A missing, damaged or different window size snapshot restores nothing.
+    """
+    if not os.path.exists(path):
+        return 0
+    with open(path, "rb") as f:
+        data = f.read()
+
+    try:
+        magic, version, size, count = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION or size != window_size:
+            return 0
+        values_record = struct.Struct(f"<{size}d")
+        restored = []
+        offset = SNAPSHOT_HEADER.size
+        for _ in range(count):
+            history_id, patient_id, window_count, position = SNAPSHOT_WINDOW.unpack_from(data, offset)
+            offset += SNAPSHOT_WINDOW.size
+            values = list(values_record.unpack_from(data, offset))
+            offset += values_record.size
+            restored.append((history_id, patient_id, window_count, position, values))
+    except struct.error:
+        return 0
+
+    histories = get_histories()
+    for history_id, patient_id, window_count, position, values in restored:
+        window = get_window(histories[history_id], patient_id)
+        window.values = values
+        window.count = min(window_count, size)
+        window.position = position % size
+        window.recompute()
+    return len(restored)
+
+
+def is_steady(patient_id):
+    """True once every window this process keeps for the patient is full"""
+    windows = [history[patient_id] for history in get_histories() if patient_id in history]
+    return bool(windows) and all(window.count >= window.size for window in windows)
+
+
+def get_window(history, patient_id):
+    window = history.get(patient_id)
+    if window is None:
+        window = history[patient_id] = RollingWindow(window_size)
+    return window
+
+
+def frequency_analyzer(frequency_value, patient_id=0):
+    frequency_window = get_window(frequency_history, patient_id)
+    with window_lock:
+        frequency_window.add(frequency_value)
 
-def frequency_analyzer(frequency_value):
-    frequency_history.append(frequency_value)
-    if len(frequency_history) > 30:
-        frequency_history.pop(0)
-    
     return {
         "type": "frequency",
-        "timestamp": get_current_timestamp(),
-        "mean": calculate_mean(frequency_history),
-        "std_dev": calculate_standard_deviation(frequency_history)
+        "patient_id": patient_id,
+        "timestamp_ns": now_ns(),
+        "mean": frequency_window.mean,
+        "std_dev": frequency_window.standard_deviation()
     }
 
 
-def pressure_analyzer(pressure_list):
+def pressure_analyzer(pressure_list, patient_id=0):
     systolic, diastolic = pressure_list
-    pressure_history.append([systolic, diastolic])
-    if len(pressure_history) > 30:
-        pressure_history.pop(0)
-    
-    systolic_values = [p[0] for p in pressure_history]
-    diastolic_values = [p[1] for p in pressure_history]
-    
+    systolic_window = get_window(systolic_history, patient_id)
+    diastolic_window = get_window(diastolic_history, patient_id)
+    with window_lock:
+        systolic_window.add(systolic)
+        diastolic_window.add(diastolic)
+
     return {
         "type": "pressure",
-        "timestamp": get_current_timestamp(),
-        "mean": [calculate_mean(systolic_values), calculate_mean(diastolic_values)],
-        "std_dev": [calculate_standard_deviation(systolic_values), calculate_standard_deviation(diastolic_values)]
+        "patient_id": patient_id,
+        "timestamp_ns": now_ns(),
+        "mean": [systolic_window.mean, diastolic_window.mean],
+        "std_dev": [systolic_window.standard_deviation(), diastolic_window.standard_deviation()]
     }
 
 
-def oxygen_analyzer(oxygen_value):
-    oxygen_history.append(oxygen_value)
-    if len(oxygen_history) > 30:
-        oxygen_history.pop(0)
-    
+def oxygen_analyzer(oxygen_value, patient_id=0):
+    oxygen_window = get_window(oxygen_history, patient_id)
+    with window_lock:
+        oxygen_window.add(oxygen_value)
+
     return {
         "type": "oxygen",
-        "timestamp": get_current_timestamp(),
-        "mean": calculate_mean(oxygen_history),
-        "std_dev": calculate_standard_deviation(oxygen_history)
-    }
\ No newline at end of file
+        "patient_id": patient_id,
+        "timestamp_ns": now_ns(),
+        "mean": oxygen_window.mean,
+        "std_dev": oxygen_window.standard_deviation()
+    }
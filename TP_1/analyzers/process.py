@@ -2,33 +2,223 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+import threading
+import time
 from multiprocessing import Queue
 from multiprocessing.connection import Connection
-from analyzers import frequency_analyzer, pressure_analyzer, oxygen_analyzer
+from analyzers import (
+    frequency_analyzer,
+    pressure_analyzer,
+    oxygen_analyzer,
+    save_snapshot,
+    load_snapshot,
+    is_steady,
+)
+from common import StageTracer
 
+SNAPSHOT_INTERVAL = 5.0
 
-def frequency_process(pipe: Connection, queue: Queue):
-    while True:
-        data = pipe.recv()
-        if data is None:
-            break
-        result = frequency_analyzer(data["frequency"])
-        queue.put(result)
 
+def run_snapshots(path, interval, stop):
+    # Runs in its own thread so the analyzer loop never pays for a snapshot
+    while not stop.wait(interval):
+        save_snapshot(path)
 
-def pressure_process(pipe: Connection, queue: Queue):
-    while True:
-        data = pipe.recv()
-        if data is None:
-            break
-        result = pressure_analyzer(data["pressure"])
-        queue.put(result)
 
+def start_snapshots(path, interval):
+    stop = threading.Event()
+    thread = threading.Thread(target=run_snapshots, args=(path, interval, stop), daemon=True)
+    thread.start()
+    return stop, thread
+
+
+class SteadyWatch:
+    """Time and samples from process start to the first result computed on full windows"""
+
+    def __init__(self, name, tracer, restored):
+        self.name = name
+        self.tracer = tracer
+        self.restored = restored
+        self.start_ns = time.monotonic_ns()
+        self.samples = 0
+        self.steady = False
+
+    def check(self, patient_id):
+        self.samples += 1
+        if not is_steady(patient_id):
+            return
+        self.steady = True
+        elapsed_ns = time.monotonic_ns() - self.start_ns
+        self.tracer.record("restart_to_steady", elapsed_ns)
+        print(
+            f"Analyzer {self.name}: steady after {self.samples} samples, "
+            f"{elapsed_ns / 1e6:.1f} ms after start ({self.restored} windows restored)"
+        )
+
+
+def analyze_block(analyze, data, tracer, watch=None):
+    received_ns = time.monotonic_ns()
+    result = analyze(data)
+    if watch is not None and not watch.steady:
+        watch.check(data["patient_id"])
+    # The sequence id of the raw block is what the verifier joins on
+    result["seq"] = data["seq"]
+    result["generated_ns"] = data["generated_ns"]
+    result["analyzed_ns"] = time.monotonic_ns()
+
+    tracer.record("transport", received_ns - data["generated_ns"])
+    tracer.record("analyze", result["analyzed_ns"] - received_ns)
+    return result
+
+
+def run_analyzer(
+    pipe: Connection,
+    queue: Queue,
+    analyze,
+    batch_size=1,
+    linger_ms=0.0,
+    name="analyzer",
+    trace=False,
+    snapshot_path=None,
+    snapshot_interval=SNAPSHOT_INTERVAL,
+):
+    """Receive raw blocks, analyze them and deliver the results to the verifier.
+
+    With batch_size > 1 results are sent as lists, flushed when the batch is
+    full or linger_ms after its first result, whichever comes first.
+    Returns the stage tracer, which is also printed on SIGUSR1 and, with
+    trace, at shutdown.
+
+    With snapshot_path the windows are restored from it at startup, saved
+    every snapshot_interval seconds by a background thread and once more at
+    shutdown. The time until the first result on full windows is reported.
+    """
+    tracer = StageTracer(name)
+    tracer.install_signal()
+
+    watch = None
+    if snapshot_path is not None:
+        watch = SteadyWatch(name, tracer, load_snapshot(snapshot_path))
+        stop, snapshot_thread = start_snapshots(snapshot_path, snapshot_interval)
 
-def oxygen_process(pipe: Connection, queue: Queue):
+    if batch_size <= 1:
+        while True:
+            data = pipe.recv()
+            if data is None:
+                break
+            queue.put(analyze_block(analyze, data, tracer, watch))
+    else:
+        run_batched(pipe, queue, analyze, batch_size, linger_ms, tracer, watch)
+
+    if snapshot_path is not None:
+        stop.set()
+        snapshot_thread.join()
+        save_snapshot(snapshot_path)
+
+    if trace:
+        tracer.dump()
+    return tracer
+
+
+def run_batched(pipe, queue, analyze, batch_size, linger_ms, tracer, watch=None):
+    batch = []
+    deadline = 0.0
     while True:
+        if batch and not pipe.poll(max(deadline - time.monotonic(), 0.0)):
+            queue.put(batch)
+            batch = []
+            continue
+
         data = pipe.recv()
         if data is None:
             break
-        result = oxygen_analyzer(data["oxygen"])
-        queue.put(result)
\ No newline at end of file
+
+        if not batch:
+            deadline = time.monotonic() + linger_ms / 1000
+        batch.append(analyze_block(analyze, data, tracer, watch))
+        # A busy pipe always polls ready, the deadline is checked here as well
+        if len(batch) >= batch_size or time.monotonic() >= deadline:
+            queue.put(batch)
+            batch = []
+
+    if batch:
+        queue.put(batch)
+
+
+# One raw block in, one analyzer result out, shared by the process and asyncio runners
+def analyze_frequency(data):
+    return frequency_analyzer(data["frequency"], data["patient_id"])
+
+
+def analyze_pressure(data):
+    return pressure_analyzer(data["pressure"], data["patient_id"])
+
+
+def analyze_oxygen(data):
+    return oxygen_analyzer(data["oxygen"], data["patient_id"])
+
+
+def frequency_process(
+    pipe: Connection,
+    queue: Queue,
+    batch_size=1,
+    linger_ms=0.0,
+    trace=False,
+    snapshot_path=None,
+    snapshot_interval=SNAPSHOT_INTERVAL,
+):
+    return run_analyzer(
+        pipe,
+        queue,
+        analyze_frequency,
+        batch_size,
+        linger_ms,
+        "frequency",
+        trace,
+        snapshot_path,
+        snapshot_interval,
+    )
+
+
+def pressure_process(
+    pipe: Connection,
+    queue: Queue,
+    batch_size=1,
+    linger_ms=0.0,
+    trace=False,
+    snapshot_path=None,
+    snapshot_interval=SNAPSHOT_INTERVAL,
+):
+    return run_analyzer(
+        pipe,
+        queue,
+        analyze_pressure,
+        batch_size,
+        linger_ms,
+        "pressure",
+        trace,
+        snapshot_path,
+        snapshot_interval,
+    )
+
+
+def oxygen_process(
+    pipe: Connection,
+    queue: Queue,
+    batch_size=1,
+    linger_ms=0.0,
+    trace=False,
+    snapshot_path=None,
+    snapshot_interval=SNAPSHOT_INTERVAL,
+):
+    return run_analyzer(
+        pipe,
+        queue,
+        analyze_oxygen,
+        batch_size,
+        linger_ms,
+        "oxygen",
+        trace,
+        snapshot_path,
+        snapshot_interval,
+    )
@@ -0,0 +1,251 @@
+import argparse
+import asyncio
+import signal
+import time
+from generator import generate_raw_data_block
+from analyzers import analyze_block, analyze_frequency, analyze_pressure, analyze_oxygen
+from verifier import Verifier
+from verifier.process import PENDING_TIMEOUT
+from common import (
+    clear_blockchain,
+    StageTracer,
+    LoadSchedule,
+    add_durability_arguments,
+    add_load_arguments,
+    get_durability_options,
+    get_load_options,
+    SEGMENT_SIZE,
+)
+
+ANALYZERS = (
+    ("frequency", analyze_frequency),
+    ("pressure", analyze_pressure),
+    ("oxygen", analyze_oxygen),
+)
+
+# Raw blocks waiting for each analyzer task
+QUEUE_SIZE = 1024
+
+
+async def run_analyzer_task(analyze, in_queue, verify_queue, tracer):
+    while True:
+        data = await in_queue.get()
+        if data is None:
+            break
+        await verify_queue.put(analyze_block(analyze, data, tracer))
+
+
+async def run_verifier_task(verifier, verify_queue, pending_timeout):
+    while True:
+        # wait_for wraps the get in a task, only worth it when the queue is empty
+        if verify_queue.empty():
+            try:
+                message = await asyncio.wait_for(verify_queue.get(), pending_timeout)
+            except asyncio.TimeoutError:
+                verifier.expire()
+                continue
+        else:
+            message = verify_queue.get_nowait()
+        if message is None:
+            break
+        verifier.handle(message)
+
+
+async def send_block(analyzer_queues, patient_id, tracer):
+    data_block = generate_raw_data_block(patient_id)
+    for queue in analyzer_queues:
+        await queue.put(data_block)
+    # Tiempo esperando lugar en las colas, crece cuando los analizadores no dan abasto
+    tracer.record("send", time.monotonic_ns() - data_block["generated_ns"])
+
+
+async def run_load_generator(
+    analyzer_queues, patients, rate=0.0, blocks=None, duration=None, credits=None, tracer=None
+):
+    """main.run_load_generator with asyncio sleeps and an asyncio.Semaphore"""
+    schedule = LoadSchedule(rate, blocks, duration)
+
+    while schedule.running():
+        if credits is not None:
+            await credits.acquire()
+        delay = schedule.delay()
+        if delay:
+            await asyncio.sleep(delay)
+
+        await send_block(analyzer_queues, schedule.sent % patients, tracer)
+        schedule.sent += 1
+        if not schedule.interval and schedule.sent % 64 == 0:
+            # Sin ritmo el generador cede el loop de vez en cuando aunque las colas tengan lugar
+            await asyncio.sleep(0)
+
+    return schedule.finish()
+
+
+async def run_tasks(
+    patients,
+    samples,
+    rate,
+    blocks,
+    duration,
+    pacing,
+    window,
+    queue_size,
+    pending_timeout,
+    trace,
+    verifier_options,
+):
+    # Modo carga: sin el sleep(1) fijo, con ritmo y cantidad configurables
+    load_mode = rate is not None or blocks is not None or duration is not None
+    credits = asyncio.Semaphore(window) if load_mode and pacing == "closed" else None
+
+    verifier = Verifier(pending_timeout=pending_timeout, credits=credits, **verifier_options)
+    tracer = StageTracer("generator")
+    analyzer_tracers = [StageTracer(name) for name, _ in ANALYZERS]
+    tracers = [tracer, *analyzer_tracers, verifier.tracer]
+
+    # Un solo proceso: SIGUSR1 imprime las latencias de todas las tareas
+    if hasattr(signal, "SIGUSR1"):
+        signal.signal(signal.SIGUSR1, lambda signum, frame: [t.dump() for t in tracers])
+
+    # Colas acotadas, el generador espera cuando un analizador se atrasa
+    analyzer_queues = [asyncio.Queue(queue_size) for _ in ANALYZERS]
+    verify_queue = asyncio.Queue(queue_size)
+
+    verifier_task = asyncio.create_task(run_verifier_task(verifier, verify_queue, pending_timeout))
+    analyzer_tasks = [
+        asyncio.create_task(run_analyzer_task(analyze, in_queue, verify_queue, analyzer_tracer))
+        for (_, analyze), in_queue, analyzer_tracer in zip(ANALYZERS, analyzer_queues, analyzer_tracers)
+    ]
+
+    start = time.monotonic()
+    max_lag = 0.0
+    if load_mode:
+        sent, max_lag = await run_load_generator(
+            analyzer_queues, patients, rate or 0.0, blocks, duration, credits, tracer
+        )
+    else:
+        sent = samples * patients
+        for i in range(samples):
+            for patient_id in range(patients):
+                await send_block(analyzer_queues, patient_id, tracer)
+
+            await asyncio.sleep(1)
+
+    # Terminar tareas, el verificador recibe None despues del ultimo resultado
+    for queue in analyzer_queues:
+        await queue.put(None)
+    await asyncio.gather(*analyzer_tasks)
+    await verify_queue.put(None)
+    await verifier_task
+    verifier_result = verifier.close()
+    elapsed = time.monotonic() - start
+
+    if trace:
+        for stage_tracer in tracers:
+            stage_tracer.dump()
+
+    return {
+        "sent": sent,
+        "elapsed_s": elapsed,
+        "max_lag_s": max_lag,
+        "tracer": tracer,
+        "analyzers": analyzer_tracers,
+        "verifier": verifier_result,
+    }
+
+
+def run_async_pipeline(
+    patients=1,
+    samples=60,
+    merkle_batch=0,
+    rate=None,
+    blocks=None,
+    duration=None,
+    pacing="open",
+    window=1000,
+    verbose=True,
+    trace=False,
+    durability="none",
+    sync_every=100,
+    sync_interval_ms=10.0,
+    write_queue_size=1024,
+    segment_size=SEGMENT_SIZE,
+    resume=False,
+    queue_size=QUEUE_SIZE,
+    pending_timeout=PENDING_TIMEOUT,
+):
+    """Generator, analyzers and verifier as asyncio tasks of a single process.
+
+    The tasks reuse the generator, analyze and Verifier functions of the
+    process pipeline and are connected by bounded asyncio.Queues. Only the
+    chain writer keeps its own thread, so fsyncs do not stop the loop.
+    Returns the generator summary of run_pipeline plus the analyzer tracers
+    and the verifier result.
+    """
+    # Limpiar blockchain al inicio, salvo que se continúe la cadena existente
+    if not resume:
+        clear_blockchain()
+
+    verifier_options = {
+        "merkle_batch": merkle_batch,
+        "verbose": verbose,
+        "durability": durability,
+        "sync_every": sync_every,
+        "sync_interval_ms": sync_interval_ms,
+        "write_queue_size": write_queue_size,
+        "segment_size": segment_size,
+        "resume": resume,
+    }
+    return asyncio.run(
+        run_tasks(
+            patients,
+            samples,
+            rate,
+            blocks,
+            duration,
+            pacing,
+            window,
+            queue_size,
+            pending_timeout,
+            trace,
+            verifier_options,
+        )
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Biometric analysis pipeline in a single process, for machines with one or two cores"
+    )
+    parser.add_argument("--patients", type=int, default=1, help="number of monitored patients")
+    parser.add_argument(
+        "--merkle-batch",
+        type=int,
+        default=0,
+        help="chain N readings per block under a Merkle root (0 chains one block per reading)",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=QUEUE_SIZE,
+        help="raw blocks waiting per analyzer task before the generator waits",
+    )
+    add_durability_arguments(parser)
+    add_load_arguments(parser)
+    parser.add_argument("--quiet", action="store_true", help="do not print every block")
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="print the per-stage latency histograms of every task at shutdown (also on SIGUSR1)",
+    )
+    args = parser.parse_args()
+
+    run_async_pipeline(
+        patients=args.patients,
+        merkle_batch=args.merkle_batch,
+        verbose=not args.quiet,
+        trace=args.trace,
+        queue_size=args.queue_size,
+        **get_load_options(args),
+        **get_durability_options(args),
+    )
@@ -0,0 +1,77 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import threading
+import time
+from multiprocessing import Pipe, Process, Queue
+from generator import generate_raw_data_block
+from analyzers import frequency_process
+
+
+def feed(pipe, blocks, interval, send_times):
+    data_block = generate_raw_data_block()
+    next_send = time.perf_counter()
+    for _ in range(blocks):
+        if interval:
+            next_send += interval
+            delay = next_send - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        send_times.append(time.perf_counter())
+        pipe.send(data_block)
+    pipe.send(None)
+
+
+def run(blocks, batch_size, linger_ms, interval):
+    """Throughput and per-result latency of one analyzer delivering to a Queue"""
+    pipe_input, pipe_output = Pipe()
+    queue = Queue()
+    process = Process(target=frequency_process, args=(pipe_output, queue, batch_size, linger_ms))
+    process.start()
+
+    send_times = []
+    feeder = threading.Thread(target=feed, args=(pipe_input, blocks, interval, send_times))
+    start = time.perf_counter()
+    feeder.start()
+
+    latencies = []
+    received = 0
+    while received < blocks:
+        message = queue.get()
+        now = time.perf_counter()
+        results = message if isinstance(message, list) else [message]
+        for _ in results:
+            # Results arrive in the same order the blocks were sent
+            latencies.append(now - send_times[received])
+            received += 1
+
+    elapsed = time.perf_counter() - start
+    feeder.join()
+    process.join()
+
+    latencies.sort()
+    return {
+        "rate": blocks / elapsed,
+        "p50": latencies[len(latencies) // 2] * 1000,
+        "p99": latencies[int(len(latencies) * 0.99)] * 1000,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyzer to verifier batching benchmark")
+    parser.add_argument("--blocks", type=int, default=50_000)
+    parser.add_argument("--paced-rate", type=float, default=2000, help="blocks/s of the latency run")
+    args = parser.parse_args()
+
+    settings = [(1, 0), (16, 1), (64, 2), (256, 5), (1024, 10)]
+
+    print(f"{'batch':>6} {'linger ms':>10} {'max blocks/s':>13} {'p50 ms':>8} {'p99 ms':>8}")
+    for batch_size, linger_ms in settings:
+        throughput = run(args.blocks, batch_size, linger_ms, 0)
+        paced = run(min(args.blocks, int(args.paced_rate * 5)), batch_size, linger_ms, 1 / args.paced_rate)
+        print(
+            f"{batch_size:>6} {linger_ms:>10} {throughput['rate']:>13,.0f} "
+            f"{paced['p50']:>8.2f} {paced['p99']:>8.2f}"
+        )
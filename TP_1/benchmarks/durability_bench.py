@@ -0,0 +1,49 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+from pipeline_bench import run, describe_incomplete
+
+SETTINGS = [
+    ("none", {}),
+    ("interval", {"sync_interval_ms": 50.0}),
+    ("interval", {"sync_interval_ms": 10.0}),
+    ("count", {"sync_every": 1000}),
+    ("count", {"sync_every": 100}),
+    ("count", {"sync_every": 10}),
+    ("block", {}),
+]
+
+
+def describe(durability, options):
+    if "sync_interval_ms" in options:
+        return f"{durability} {options['sync_interval_ms']:g}ms"
+    if "sync_every" in options:
+        return f"{durability} {options['sync_every']}"
+    return durability
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Chain durability modes: throughput against commit latency")
+    parser.add_argument("--blocks", type=int, default=10_000)
+    parser.add_argument("--paced-rate", type=float, default=1000, help="raw blocks/s of the latency run")
+    parser.add_argument("--data-dir", help="where the scratch chains are written, the disk under test")
+    args = parser.parse_args()
+
+    print(
+        f"{'mode':>15} {'max readings/s':>15} {'fsyncs':>7} "
+        f"{'p50 ms':>8} {'p99 ms':>8} {'fsync p50 ms':>13}"
+    )
+    for durability, options in SETTINGS:
+        params = {"blocks": args.blocks, "durability": durability, **options}
+        throughput = run({**params, "rate": 0.0}, args.data_dir)
+        paced_blocks = min(args.blocks, int(args.paced_rate * 5))
+        paced = run({**params, "rate": args.paced_rate, "blocks": paced_blocks}, args.data_dir)
+        fsync = paced["trace"].get("verifier.fsync", {"p50_ms": 0.0})
+        print(
+            f"{describe(durability, options):>15} {throughput['readings_per_s']:>15,.0f} "
+            f"{throughput['syncs']:>7} {paced['latency']['p50_ms']:>8.2f} "
+            f"{paced['latency']['p99_ms']:>8.2f} {fsync['p50_ms']:>13.3f} "
+            f"{describe_incomplete(throughput) or describe_incomplete(paced)}".rstrip()
+        )
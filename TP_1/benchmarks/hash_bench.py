@@ -0,0 +1,74 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import time
+from common import calculate_block_hash
+from common.encryption import LEGACY_HASH_VERSION, HASH_VERSION, MERKLE_HASH_VERSION
+from common.merkle import merkle_root, merkle_proof, verify_merkle_proof
+
+
+def random_data():
+    return {
+        "timestamp": "2025-01-01T00:00:00",
+        "alert": False,
+        "patient_id": random.randint(0, 1000),
+        "frequency": {"mean": random.uniform(60, 180), "std_dev": random.uniform(0, 40)},
+        "pressure": {
+            "mean": [random.uniform(110, 180), random.uniform(70, 110)],
+            "std_dev": [random.uniform(0, 20), random.uniform(0, 20)],
+        },
+        "oxygen": {"mean": random.uniform(90, 100), "std_dev": random.uniform(0, 4)},
+    }
+
+
+def measure(blocks, version):
+    previous_hash = "0"
+    start = time.perf_counter()
+    for data in blocks:
+        previous_hash = calculate_block_hash(previous_hash, data, "2025-01-01T00:00:00", version)
+    return len(blocks) / (time.perf_counter() - start)
+
+
+def measure_merkle(blocks, batch_size):
+    """Readings per second chained in Merkle batches, and proof checks per second"""
+    previous_hash = "0"
+    start = time.perf_counter()
+    for i in range(0, len(blocks), batch_size):
+        root = merkle_root(blocks[i:i + batch_size])
+        previous_hash = calculate_block_hash(
+            previous_hash, {"merkle_root": root}, "2025-01-01T00:00:00", MERKLE_HASH_VERSION
+        )
+    chain_rate = len(blocks) / (time.perf_counter() - start)
+
+    batch = blocks[:batch_size]
+    root = merkle_root(batch)
+    proofs = [(batch[i], merkle_proof(batch, i)) for i in range(0, len(batch), max(1, len(batch) // 100))]
+    start = time.perf_counter()
+    for reading, proof in proofs:
+        verify_merkle_proof(reading, proof, root)
+    proof_time = (time.perf_counter() - start) / len(proofs)
+    return chain_rate, proof_time
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Block hashing throughput by encoding version")
+    parser.add_argument("--blocks", type=int, default=200_000)
+    parser.add_argument("--merkle-batches", type=int, nargs="+", default=[16, 256, 4096])
+    args = parser.parse_args()
+
+    blocks = [random_data() for _ in range(args.blocks)]
+
+    legacy_rate = measure(blocks, LEGACY_HASH_VERSION)
+    binary_rate = measure(blocks, HASH_VERSION)
+    print(f"v{LEGACY_HASH_VERSION} str(data): {legacy_rate:>12,.0f} hashes/s")
+    print(f"v{HASH_VERSION} binary:    {binary_rate:>12,.0f} hashes/s ({binary_rate / legacy_rate:.1f}x)")
+
+    for batch_size in args.merkle_batches:
+        chain_rate, proof_time = measure_merkle(blocks, batch_size)
+        print(
+            f"v{MERKLE_HASH_VERSION} Merkle batch {batch_size:>5}: {chain_rate:>12,.0f} readings/s, "
+            f"proof check {proof_time * 1e6:.1f} us"
+        )
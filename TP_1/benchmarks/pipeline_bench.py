@@ -0,0 +1,235 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import functools
+import json
+import queue
+import subprocess
+import tempfile
+import time
+from multiprocessing import Process, Queue
+from common import StageTracer, DURABILITY_MODES, run_stage
+from main import run_pipeline
+from async_main import run_async_pipeline
+
+RUNNERS = ("process", "asyncio")
+
+# Options of the process topology that have no meaning in the single process runner
+PROCESS_ONLY = ("shards", "transport", "ring_slots", "batch_size", "linger_ms")
+
+
+def get_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def collect_stages(stats_queue, expected, process):
+    # Stages report when they finish, keep waiting while the runner is alive
+    stages = []
+    while len(stages) < expected:
+        alive = process.is_alive()
+        try:
+            stages.append(stats_queue.get(timeout=1))
+        except queue.Empty:
+            if not alive:
+                raise RuntimeError(f"{process.name} exited with {len(stages)}/{expected} stages reported")
+    return stages
+
+
+def summarize_stages(stages):
+    """CPU seconds and peak RSS per stage, analyzers of every shard added together"""
+    summary = {}
+    for stage in stages:
+        entry = summary.setdefault(stage["stage"], {"processes": 0, "cpu_s": 0.0, "max_rss_kb": 0})
+        entry["processes"] += 1
+        entry["cpu_s"] += stage["cpu_user_s"] + stage["cpu_system_s"]
+        entry["max_rss_kb"] = max(entry["max_rss_kb"], stage["max_rss_kb"])
+    return summary
+
+
+def merge_tracers(tracers):
+    """One tracer per process name, the analyzers of every shard merged together"""
+    merged = {}
+    for tracer in tracers:
+        merged.setdefault(tracer.name, StageTracer(tracer.name)).merge(tracer)
+    return {
+        f"{name}.{stage}": summary
+        for name, tracer in merged.items()
+        for stage, summary in tracer.summary().items()
+    }
+
+
+def run_child(stage, target, kwargs, stats_queue, expected):
+    # The runner gets its own process so its CPU and RSS are not mixed with the benchmark's
+    process = Process(target=run_stage, args=(stage, stats_queue, target), kwargs=kwargs)
+    process.start()
+    stages = collect_stages(stats_queue, expected, process)
+    process.join()
+    return stages
+
+
+def run(params, data_dir=None, runner="process"):
+    """Run the whole pipeline once in a scratch data directory (under data_dir) and measure it.
+
+    runner "process" is main.run_pipeline, one process per stage; "asyncio" is
+    async_main.run_async_pipeline, every stage as a task of one process.
+    """
+    stats_queue = Queue()
+    with tempfile.TemporaryDirectory(prefix="tp1-bench-", dir=data_dir) as data_dir:
+        os.environ["TP1_DATA_DIR"] = data_dir
+        try:
+            if runner == "asyncio":
+                kwargs = {key: value for key, value in params.items() if key not in PROCESS_ONLY}
+                stages = run_child(
+                    "asyncio", run_async_pipeline, {**kwargs, "verbose": False}, stats_queue, 1
+                )
+            else:
+                # The analyzers and the verifier report to the same queue as the generator
+                target = functools.partial(run_pipeline, stats_queue=stats_queue)
+                expected = params.get("shards", 1) * 3 + 2
+                stages = run_child("generator", target, {**params, "verbose": False}, stats_queue, expected)
+        finally:
+            del os.environ["TP1_DATA_DIR"]
+
+    if runner == "asyncio":
+        pipeline = stages[0]["result"]
+        verifier = pipeline["verifier"]
+        tracers = [pipeline["tracer"], *pipeline["analyzers"], verifier["tracer"]]
+    else:
+        pipeline = next(stage for stage in stages if stage["stage"] == "generator")["result"]
+        verifier = next(stage for stage in stages if stage["stage"] == "verifier")["result"]
+        tracers = [pipeline["tracer"], verifier["tracer"]]
+        tracers.extend(
+            stage["result"] for stage in stages if stage["stage"] not in ("generator", "verifier")
+        )
+    trace = merge_tracers(tracers)
+    elapsed = pipeline["elapsed_s"]
+    return {
+        "runner": runner,
+        "sent": pipeline["sent"],
+        "readings": verifier["completed"],
+        "blocks": verifier["blocks"],
+        "elapsed_s": elapsed,
+        "readings_per_s": verifier["completed"] / elapsed if elapsed else 0.0,
+        "syncs": verifier["syncs"],
+        "writer": {
+            "max_depth": verifier["writer"]["max_depth"],
+            "mean_depth": verifier["writer"]["mean_depth"],
+            "stalls": verifier["writer"]["stalls"],
+            "stall_s": verifier["writer"]["stall_ns"] / 1e9,
+        },
+        "max_lag_ms": pipeline["max_lag_s"] * 1000,
+        "latency": trace["verifier.end_to_end"],
+        "dropped": {
+            key: verifier[key]
+            for key in ("evicted_timeout", "evicted_overflow", "late", "incomplete_at_shutdown")
+        },
+        # A run that lost readings measured a different load than the one asked for
+        "complete": verifier["completed"] == pipeline["sent"],
+        "stages": summarize_stages(stages),
+        "trace": trace,
+    }
+
+
+def describe_incomplete(result):
+    """Empty for a run that chained every reading sent, otherwise a mark for its row"""
+    if result["complete"]:
+        return ""
+    return f"INCOMPLETE: {result['readings']} of {result['sent']} readings chained"
+
+
+def print_result(result):
+    latency = result["latency"]
+    print(
+        f"{result['readings']} readings in {result['elapsed_s']:.2f}s "
+        f"({result['readings_per_s']:,.0f} readings/s, {result['blocks']} blocks)"
+    )
+    dropped = result["dropped"]
+    print(
+        f"dropped: {dropped['evicted_timeout']} evicted by timeout, "
+        f"{dropped['evicted_overflow']} evicted by overflow, {dropped['late']} late results, "
+        f"{dropped['incomplete_at_shutdown']} incomplete at shutdown"
+    )
+    if not result["complete"]:
+        print(f"{describe_incomplete(result)}, the figures above do not measure the requested load")
+    print(
+        f"latency ms: p50 {latency['p50_ms']:.2f}  p95 {latency['p95_ms']:.2f}  "
+        f"p99 {latency['p99_ms']:.2f}  max {latency['max_ms']:.2f}"
+    )
+    writer = result["writer"]
+    print(
+        f"write queue: max depth {writer['max_depth']}, mean {writer['mean_depth']:.1f}, "
+        f"{writer['stalls']} stalls, {writer['stall_s']:.3f}s stalled"
+    )
+    print(f"{'stage':>10} {'procs':>6} {'cpu s':>8} {'peak rss MB':>12}")
+    for stage, entry in result["stages"].items():
+        print(
+            f"{stage:>10} {entry['processes']:>6} {entry['cpu_s']:>8.2f} "
+            f"{entry['max_rss_kb'] / 1024:>12.1f}"
+        )
+    print(f"{'trace':>20} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for stage, summary in result["trace"].items():
+        print(
+            f"{stage:>20} {summary['p50_ms']:>9.3f} {summary['p95_ms']:>9.3f} "
+            f"{summary['p99_ms']:>9.3f} {summary['max_ms']:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="End-to-end pipeline benchmark")
+    parser.add_argument("--runner", choices=RUNNERS, default="process")
+    parser.add_argument("--patients", type=int, default=1)
+    parser.add_argument("--shards", type=int, default=1)
+    parser.add_argument("--transport", choices=["pipe", "ring"], default="pipe")
+    parser.add_argument("--ring-slots", type=int, default=1024)
+    parser.add_argument("--batch-size", type=int, default=1)
+    parser.add_argument("--linger-ms", type=float, default=0.0)
+    parser.add_argument("--merkle-batch", type=int, default=0)
+    parser.add_argument("--rate", type=float, default=0.0, help="raw blocks/s, 0 for as fast as possible")
+    parser.add_argument("--blocks", type=int, default=20_000)
+    parser.add_argument("--duration", type=float)
+    parser.add_argument("--pacing", choices=["open", "closed"], default="open")
+    parser.add_argument("--window", type=int, default=1000)
+    parser.add_argument("--durability", choices=DURABILITY_MODES, default="none")
+    parser.add_argument("--sync-every", type=int, default=100)
+    parser.add_argument("--sync-interval-ms", type=float, default=10.0)
+    parser.add_argument("--write-queue", type=int, default=1024)
+    parser.add_argument("--data-dir", help="where the scratch chain is written, the disk under test")
+    parser.add_argument("--output", help="append the result as a JSON line to this file")
+    args = parser.parse_args()
+
+    params = {
+        "patients": args.patients,
+        "shards": args.shards,
+        "transport": args.transport,
+        "ring_slots": args.ring_slots,
+        "batch_size": args.batch_size,
+        "linger_ms": args.linger_ms,
+        "merkle_batch": args.merkle_batch,
+        "rate": args.rate,
+        "blocks": args.blocks,
+        "duration": args.duration,
+        "pacing": args.pacing,
+        "window": args.window,
+        "durability": args.durability,
+        "sync_every": args.sync_every,
+        "sync_interval_ms": args.sync_interval_ms,
+        "write_queue_size": args.write_queue,
+    }
+    result = run(params, args.data_dir, args.runner)
+    print_result(result)
+
+    if args.output:
+        with open(args.output, "a") as f:
+            record = {"commit": get_commit(), "time": time.time(), "params": params, **result}
+            f.write(json.dumps(record) + "\n")
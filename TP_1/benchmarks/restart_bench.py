@@ -0,0 +1,95 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import tempfile
+import time
+from multiprocessing import Pipe, Process, Queue
+from analyzers import frequency_process, frequency_analyzer, reset_analyzers
+from common import run_stage
+
+
+def make_blocks(count, patients):
+    return [
+        {
+            "seq": seq,
+            "generated_ns": 0,
+            "patient_id": seq % patients,
+            "timestamp_ns": 0,
+            "frequency": random.randint(60, 180),
+        }
+        for seq in range(count)
+    ]
+
+
+def run_analyzer_process(blocks, snapshot_path, rate):
+    """One frequency analyzer life: feed the blocks, stop it, return its means and tracer"""
+    pipe_input, pipe_output = Pipe()
+    queue = Queue()
+    stats_queue = Queue()
+    process = Process(
+        target=run_stage,
+        args=("frequency", stats_queue, frequency_process, pipe_output, queue),
+        kwargs={"snapshot_path": snapshot_path, "snapshot_interval": 60.0},
+    )
+    process.start()
+    start = time.monotonic()
+    for sent, block in enumerate(blocks):
+        delay = start + sent / rate - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        pipe_input.send(block)
+    pipe_input.send(None)
+
+    means = [queue.get()["mean"] for _ in blocks]
+    stage = stats_queue.get()
+    process.join()
+    return means, stage["result"]
+
+
+def reference_means(blocks):
+    # The same analyzer without a restart, reset afterwards so forked analyzers start empty
+    reset_analyzers()
+    means = [frequency_analyzer(block["frequency"], block["patient_id"])["mean"] for block in blocks]
+    reset_analyzers()
+    return means
+
+
+def run(before, after, patients, warm, rate):
+    blocks = make_blocks(before + after, patients)
+    expected = reference_means(blocks)[before:]
+
+    with tempfile.TemporaryDirectory(prefix="tp1-restart-") as data_dir:
+        snapshot_path = os.path.join(data_dir, "analyzer-frequency-0.snap")
+        run_analyzer_process(blocks[:before], snapshot_path, rate)
+        if not warm:
+            os.remove(snapshot_path)
+        means, tracer = run_analyzer_process(blocks[before:], snapshot_path, rate)
+
+    errors = [abs(mean - reference) for mean, reference in zip(means, expected)]
+    steady = tracer.summary()["restart_to_steady"]
+    return {
+        "steady_ms": steady["max_ms"],
+        "max_error": max(errors),
+        "mean_error": sum(errors) / len(errors),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Analyzer restart with and without window snapshots")
+    parser.add_argument("--before", type=int, default=1000, help="samples before the restart")
+    parser.add_argument("--after", type=int, default=500, help="samples after the restart")
+    parser.add_argument("--patients", type=int, default=4)
+    parser.add_argument("--rate", type=float, default=1000, help="samples per second sent to the analyzer")
+    args = parser.parse_args()
+
+    random.seed(1)
+    print(f"{'restart':>8} {'to steady ms':>13} {'max mean error':>15} {'avg mean error':>15}")
+    for warm in (False, True):
+        result = run(args.before, args.after, args.patients, warm, args.rate)
+        print(
+            f"{'warm' if warm else 'cold':>8} {result['steady_ms']:>13.1f} "
+            f"{result['max_error']:>15.3f} {result['mean_error']:>15.3f}"
+        )
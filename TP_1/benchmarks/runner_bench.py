@@ -0,0 +1,46 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+from pipeline_bench import run, describe_incomplete, RUNNERS
+
+
+def totals(result):
+    # Every process of the runner added together: what the box pays for the pipeline
+    stages = result["stages"].values()
+    return (
+        sum(stage["processes"] for stage in stages),
+        sum(stage["cpu_s"] for stage in stages),
+        sum(stage["max_rss_kb"] * stage["processes"] for stage in stages) / 1024,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multiprocess against single process asyncio runner")
+    parser.add_argument("--blocks", type=int, default=10_000)
+    parser.add_argument("--paced-rate", type=float, default=100, help="raw blocks/s of the low-rate run")
+    parser.add_argument("--paced-seconds", type=float, default=5.0)
+    parser.add_argument("--patients", type=int, default=1)
+    parser.add_argument("--data-dir", help="where the scratch chains are written")
+    args = parser.parse_args()
+
+    runs = [
+        ("max", {"rate": 0.0, "blocks": args.blocks}),
+        (f"{args.paced_rate:g}/s", {"rate": args.paced_rate, "duration": args.paced_seconds}),
+    ]
+    print(
+        f"{'load':>8} {'runner':>8} {'procs':>6} {'readings/s':>11} {'p50 ms':>8} {'p99 ms':>8} "
+        f"{'cpu s':>7} {'cpu ms/1k':>10} {'rss MB':>7}"
+    )
+    for load, params in runs:
+        for runner in RUNNERS:
+            result = run({"patients": args.patients, **params}, args.data_dir, runner)
+            processes, cpu_s, rss_mb = totals(result)
+            latency = result["latency"]
+            print(
+                f"{load:>8} {runner:>8} {processes:>6} {result['readings_per_s']:>11,.0f} "
+                f"{latency['p50_ms']:>8.2f} {latency['p99_ms']:>8.2f} {cpu_s:>7.2f} "
+                f"{cpu_s * 1e6 / max(result['readings'], 1):>10.1f} {rss_mb:>7.1f} "
+                f"{describe_incomplete(result)}".rstrip()
+            )
@@ -0,0 +1,70 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import random
+import time
+from common import calculate_mean, calculate_standard_deviation, RollingWindow
+
+
+def list_window(samples, window_size):
+    # Previous analyzer implementation: list history, pop(0) and full recompute
+    history = []
+    for value in samples:
+        history.append(value)
+        if len(history) > window_size:
+            history.pop(0)
+        calculate_mean(history)
+        calculate_standard_deviation(history)
+
+
+def rolling_window(samples, window_size):
+    window = RollingWindow(window_size)
+    for value in samples:
+        window.add(value)
+        window.mean
+        window.standard_deviation()
+
+
+def check_accuracy(samples, window_size):
+    window = RollingWindow(window_size)
+    history = []
+    max_error = 0.0
+    for value in samples:
+        window.add(value)
+        history.append(value)
+        if len(history) > window_size:
+            history.pop(0)
+        max_error = max(
+            max_error,
+            abs(window.mean - calculate_mean(history)),
+            abs(window.standard_deviation() - calculate_standard_deviation(history)),
+        )
+    return max_error
+
+
+def measure(function, samples, window_size):
+    start = time.perf_counter()
+    function(samples, window_size)
+    elapsed = time.perf_counter() - start
+    return len(samples) / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rolling window statistics microbenchmark")
+    parser.add_argument("--samples", type=int, default=200_000)
+    parser.add_argument("--windows", type=int, nargs="+", default=[30, 300, 3000])
+    args = parser.parse_args()
+
+    samples = [random.randint(60, 180) for _ in range(args.samples)]
+
+    print(f"{'window':>8} {'list (samples/s)':>18} {'rolling (samples/s)':>20} {'speedup':>8} {'max error':>10}")
+    for window_size in args.windows:
+        list_rate = measure(list_window, samples, window_size)
+        rolling_rate = measure(rolling_window, samples, window_size)
+        max_error = check_accuracy(samples[:20_000], window_size)
+        print(
+            f"{window_size:>8} {list_rate:>18,.0f} {rolling_rate:>20,.0f} "
+            f"{rolling_rate / list_rate:>7.1f}x {max_error:>10.1e}"
+        )
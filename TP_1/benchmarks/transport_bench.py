@@ -0,0 +1,59 @@
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import argparse
+import time
+from multiprocessing import Pipe, Process
+from generator import generate_raw_data_block
+from common.ring_buffer import BroadcastRing
+
+
+def drain(connection):
+    while connection.recv() is not None:
+        pass
+
+
+def run(transport, blocks, readers, ring_slots):
+    data_block = generate_raw_data_block()
+
+    if transport == "ring":
+        ring = BroadcastRing(readers, ring_slots)
+        senders = [ring]
+        processes = [Process(target=drain, args=(ring.reader(i),)) for i in range(readers)]
+    else:
+        senders = []
+        processes = []
+        for _ in range(readers):
+            pipe_input, pipe_output = Pipe()
+            senders.append(pipe_input)
+            processes.append(Process(target=drain, args=(pipe_output,)))
+
+    for process in processes:
+        process.start()
+
+    start = time.perf_counter()
+    for _ in range(blocks):
+        for sender in senders:
+            sender.send(data_block)
+    for sender in senders:
+        sender.send(None)
+    for process in processes:
+        process.join()
+    elapsed = time.perf_counter() - start
+
+    if transport == "ring":
+        ring.close()
+    return blocks / elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generator to analyzers fan-out benchmark")
+    parser.add_argument("--blocks", type=int, default=100_000)
+    parser.add_argument("--readers", type=int, default=3)
+    parser.add_argument("--ring-slots", type=int, default=1024)
+    args = parser.parse_args()
+
+    for transport in ("pipe", "ring"):
+        rate = run(transport, args.blocks, args.readers, args.ring_slots)
+        print(f"{transport:>5}: {rate:>10,.0f} blocks/s delivered to {args.readers} readers")
@@ -1,6 +1,137 @@
 from .generate_data import generate_random_number, get_current_timestamp
-from .statistics import calculate_mean, calculate_standard_deviation
-from .blockchain import load_blockchain, save_blockchain, add_block_to_chain, clear_blockchain
-from .encryption import calculate_block_hash
+from .clock import now_ns, format_timestamp
+from .statistics import calculate_mean, calculate_standard_deviation, RollingWindow
+from .blockchain import (
+    load_blockchain,
+    save_blockchain,
+    add_block_to_chain,
+    clear_blockchain,
+    iter_blockchain,
+    iter_blockchain_records,
+    iter_block_readings,
+    get_signal_values,
+    parse_timestamp,
+    find_first_block_at,
+    get_data_path,
+    get_blockchain_path,
+    count_blocks,
+    get_block,
+    iter_blocks,
+    rebuild_index,
+    append_block,
+    close_blockchain,
+    recover_blockchain,
+    ChainWriter,
+    DURABILITY_MODES,
+    SEGMENT_SIZE,
+    load_segments,
+    get_segment_path,
+    get_chain_size,
+    iter_segment_files,
+    read_chain_bytes,
+    convert_legacy_blockchain,
+)
+from .encryption import calculate_block_hash, encode_block_data, HASH_VERSION
+from .sharding import get_shard
+from .metrics import LatencyHistogram, StageTracer, process_usage, run_stage
+from .alert_index import (
+    ALERT_CAUSES,
+    append_alert,
+    count_alerts,
+    get_last_alert,
+    iter_alerts,
+    trim_alerts,
+    clear_alert_index,
+)
 
-__all__ = ['generate_random_number', 'get_current_timestamp', 'calculate_mean', 'calculate_standard_deviation', 'load_blockchain', 'save_blockchain', 'add_block_to_chain', 'clear_blockchain', 'calculate_block_hash']
\ No newline at end of file
+from .rollups import (
+    ROLLUP_RESOLUTIONS,
+    ROLLUP_SIGNALS,
+    RollupBuckets,
+    RollupWriter,
+    read_committed,
+    load_rollups,
+    summarize_rollups,
+    describe_bucket,
+    count_rollup_blocks,
+    compact_rollups,
+    trim_rollups,
+    clear_rollups,
+)
+from .load import (
+    LoadSchedule,
+    add_durability_arguments,
+    add_load_arguments,
+    get_durability_options,
+    get_load_options,
+)
+
+__all__ = [
+    'generate_random_number',
+    'get_current_timestamp',
+    'now_ns',
+    'format_timestamp',
+    'calculate_mean',
+    'calculate_standard_deviation',
+    'RollingWindow',
+    'load_blockchain',
+    'save_blockchain',
+    'add_block_to_chain',
+    'clear_blockchain',
+    'iter_blockchain',
+    'iter_blockchain_records',
+    'iter_block_readings',
+    'get_signal_values',
+    'parse_timestamp',
+    'find_first_block_at',
+    'get_data_path',
+    'get_blockchain_path',
+    'count_blocks',
+    'get_block',
+    'iter_blocks',
+    'rebuild_index',
+    'append_block',
+    'close_blockchain',
+    'recover_blockchain',
+    'ChainWriter',
+    'DURABILITY_MODES',
+    'SEGMENT_SIZE',
+    'load_segments',
+    'get_segment_path',
+    'get_chain_size',
+    'iter_segment_files',
+    'read_chain_bytes',
+    'convert_legacy_blockchain',
+    'calculate_block_hash',
+    'encode_block_data',
+    'HASH_VERSION',
+    'get_shard',
+    'LatencyHistogram',
+    'StageTracer',
+    'process_usage',
+    'run_stage',
+    'ALERT_CAUSES',
+    'append_alert',
+    'count_alerts',
+    'get_last_alert',
+    'iter_alerts',
+    'trim_alerts',
+    'clear_alert_index',
+    'ROLLUP_RESOLUTIONS',
+    'ROLLUP_SIGNALS',
+    'RollupBuckets',
+    'RollupWriter',
+    'read_committed',
+    'load_rollups',
+    'summarize_rollups',
+    'describe_bucket',
+    'count_rollup_blocks',
+    'compact_rollups',
+    'trim_rollups',
+    'clear_rollups',
+    'LoadSchedule',
+    'add_durability_arguments',
+    'add_load_arguments',
+    'get_durability_options',
+    'get_load_options',
+]
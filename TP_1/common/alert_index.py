@@ -0,0 +1,79 @@
+import os
+import struct
+from .blockchain import get_data_path
+
+ALERT_CAUSES = ("frequency", "oxygen", "systolic")
+
+# One file per cause with the indexes of the blocks that raised it, in append order
+ALERT_RECORD = struct.Struct("<Q")
+
+
+def get_alert_index_path(cause):
+    if cause not in ALERT_CAUSES:
+        raise ValueError(f"unknown alert cause: {cause}")
+    return get_data_path(f"alerts-{cause}.idx")
+
+
+def append_alert(block_index, causes):
+    record = ALERT_RECORD.pack(block_index)
+    for cause in causes:
+        with open(get_alert_index_path(cause), "ab") as f:
+            f.write(record)
+
+
+def count_alerts(cause):
+    alert_index_path = get_alert_index_path(cause)
+    if not os.path.exists(alert_index_path):
+        return 0
+    return os.path.getsize(alert_index_path) // ALERT_RECORD.size
+
+
+def get_last_alert(cause):
+    """Index of the last block indexed for a cause, None if it has no alerts"""
+    count = count_alerts(cause)
+    if not count:
+        return None
+    with open(get_alert_index_path(cause), "rb") as f:
+        f.seek((count - 1) * ALERT_RECORD.size)
+        return ALERT_RECORD.unpack(f.read(ALERT_RECORD.size))[0]
+
+
+def iter_alerts(cause, start=0, stop=None):
+    """Block indexes of the alerts start..stop-1 of a cause"""
+    alert_index_path = get_alert_index_path(cause)
+    if not os.path.exists(alert_index_path):
+        return
+    stop = count_alerts(cause) if stop is None else min(stop, count_alerts(cause))
+    with open(alert_index_path, "rb") as f:
+        f.seek(start * ALERT_RECORD.size)
+        while start < stop:
+            chunk = f.read(min(stop - start, 4096) * ALERT_RECORD.size)
+            if not chunk:
+                break
+            for (block_index,) in ALERT_RECORD.iter_unpack(chunk):
+                yield block_index
+            start += len(chunk) // ALERT_RECORD.size
+
+
+def trim_alerts(block_count):
+    """Drop the alerts of blocks >= block_count, reading each index from its end"""
+    record_size = ALERT_RECORD.size
+    for cause in ALERT_CAUSES:
+        alert_index_path = get_alert_index_path(cause)
+        if not os.path.exists(alert_index_path):
+            continue
+        with open(alert_index_path, "rb+") as f:
+            count = os.fstat(f.fileno()).st_size // record_size
+            while count:
+                f.seek((count - 1) * record_size)
+                (block_index,) = ALERT_RECORD.unpack(f.read(record_size))
+                if block_index < block_count:
+                    break
+                count -= 1
+            f.truncate(count * record_size)
+
+
+def clear_alert_index():
+    for cause in ALERT_CAUSES:
+        with open(get_alert_index_path(cause), "w"):
+            pass
@@ -1,34 +1,703 @@
+import bisect
+import hashlib
 import json
 import os
+import struct
+import time
+from datetime import datetime
 
+BLOCKCHAIN_FILE = "blockchain.jsonl"
+LEGACY_BLOCKCHAIN_FILE = "blockchain.json"
 
-def load_blockchain():
-    # Get the path to trabajo-practico-1 directory
-    base_path = os.path.dirname(os.path.dirname(__file__))
-    blockchain_path = os.path.join(base_path, "blockchain.json")
+# Sidecar index: one fixed-size (byte offset, length) record per block
+INDEX_RECORD = struct.Struct("<QI")
+
+# Sidecar time index: the running maximum of the block timestamps (epoch seconds),
+# non-decreasing even if blocks complete slightly out of order, so it can be bisected
+TIME_RECORD = struct.Struct("<d")
+
+DURABILITY_MODES = ("none", "count", "interval", "block")
+
+# The active segment is sealed and renamed once it reaches this size
+SEGMENT_SIZE = 64 << 20
+
+# Parsed segment headers, keyed by manifest path and size
+segment_cache = None
+
+# Bytes read per step when scanning the chain backwards from its end
+TAIL_CHUNK = 1 << 16
+
+# Writer used by append_block, opened on the first append of the process
+writer = None
+
+# A live writer keeps the indexes a few blocks behind the chain at most. Readers
+# catch them up before a search only when they lag more than this
+INDEX_LAG = 1024
+
+
+def get_data_path(filename):
+    # Get the path to trabajo-practico-1 directory, TP1_DATA_DIR moves the data elsewhere
+    base_path = os.environ.get("TP1_DATA_DIR") or os.path.dirname(os.path.dirname(__file__))
+    return os.path.join(base_path, filename)
+
+
+def get_blockchain_path(filename=BLOCKCHAIN_FILE):
+    return get_data_path(filename)
+
+
+def get_index_path(blockchain_path=None):
+    blockchain_path = blockchain_path or get_blockchain_path()
+    return os.path.splitext(blockchain_path)[0] + ".idx"
+
+
+def get_time_index_path(blockchain_path=None):
+    blockchain_path = blockchain_path or get_blockchain_path()
+    return os.path.splitext(blockchain_path)[0] + ".tidx"
+
+
+def get_segments_path(blockchain_path=None):
+    blockchain_path = blockchain_path or get_blockchain_path()
+    return os.path.splitext(blockchain_path)[0] + ".segments"
+
+
+def get_segment_path(number, blockchain_path=None):
+    blockchain_path = blockchain_path or get_blockchain_path()
+    root, extension = os.path.splitext(blockchain_path)
+    return f"{root}-{number:06d}{extension}"
+
+
+def load_segments(blockchain_path=None):
+    """Headers of the sealed segments, in chain order.
+
+    The chain is the sealed segments followed by the active file, and byte
+    offsets (index, checkpoints) are offsets into that concatenation. Each
+    header holds the segment number, first and last block index, start
+    offset and size, the previous hash of its first block, the hash of its
+    last block and the SHA-256 digest of the whole file.
+    """
+    global segment_cache
+    segments_path = get_segments_path(blockchain_path)
+    if not os.path.exists(segments_path):
+        return []
+    key = (segments_path, os.path.getsize(segments_path))
+    if segment_cache is not None and segment_cache[0] == key:
+        return segment_cache[1]
+
+    segments = []
+    with open(segments_path, "rb") as f:
+        for line in f:
+            # A header without newline was never sealed
+            if not line.endswith(b"\n"):
+                break
+            segments.append(json.loads(line))
+    segment_cache = (key, segments)
+    return segments
+
+
+def get_active_start(segments):
+    if not segments:
+        return 0
+    return segments[-1]["start_offset"] + segments[-1]["size"]
+
+
+def get_chain_size(blockchain_path=None):
+    blockchain_path = blockchain_path or get_blockchain_path()
+    active_size = os.path.getsize(blockchain_path) if os.path.exists(blockchain_path) else 0
+    return get_active_start(load_segments(blockchain_path)) + active_size
+
+
+def iter_segment_files(offset=0, blockchain_path=None):
+    """(path, segment start offset) of every file holding bytes at or after offset"""
+    blockchain_path = blockchain_path or get_blockchain_path()
+    segments = load_segments(blockchain_path)
+    for segment in segments:
+        if offset < segment["start_offset"] + segment["size"]:
+            yield get_segment_path(segment["segment"], blockchain_path), segment["start_offset"]
     if os.path.exists(blockchain_path):
-        with open(blockchain_path, "r") as f:
-            return json.load(f)
-    return []
+        yield blockchain_path, get_active_start(segments)
+
+
+def iter_chain_lines(offset=0, blockchain_path=None):
+    """Stream (offset, line) across the segments, starting at a line boundary"""
+    for path, segment_start in iter_segment_files(offset, blockchain_path):
+        local_offset = max(offset - segment_start, 0)
+        position = segment_start + local_offset
+        with open(path, "rb") as f:
+            f.seek(local_offset)
+            for line in f:
+                yield position, line
+                position += len(line)
+
+
+def read_chain_bytes(offset, length):
+    # Blocks never span two segments, rotation happens between blocks
+    segments = load_segments()
+    starts = [segment["start_offset"] for segment in segments]
+    position = bisect.bisect_right(starts, offset) - 1
+    if position >= 0 and offset < starts[position] + segments[position]["size"]:
+        path = get_segment_path(segments[position]["segment"])
+        segment_start = starts[position]
+    else:
+        path = get_blockchain_path()
+        segment_start = get_active_start(segments)
+    with open(path, "rb") as f:
+        f.seek(offset - segment_start)
+        return f.read(length)
+
+
+def recover_segments():
+    """Finish a rotation interrupted between writing the header and renaming the file"""
+    blockchain_path = get_blockchain_path()
+    segments_path = get_segments_path()
+    if os.path.exists(segments_path):
+        # A header cut short was never sealed, the next seal must not append after it
+        with open(segments_path, "rb+") as f:
+            size = os.fstat(f.fileno()).st_size
+            end = find_line_start(f, size)
+            if end < size:
+                f.truncate(end)
+    segments = load_segments()
+    if segments and not os.path.exists(get_segment_path(segments[-1]["segment"])):
+        if os.path.exists(blockchain_path):
+            os.replace(blockchain_path, get_segment_path(segments[-1]["segment"]))
+    if segments and not os.path.exists(blockchain_path):
+        with open(blockchain_path, "wb"):
+            pass
+
+
+def parse_timestamp(timestamp):
+    return datetime.fromisoformat(timestamp).timestamp()
+
+
+def encode_block(block):
+    # One block per line, compact and without newlines inside the record
+    return json.dumps(block, separators=(",", ":")) + "\n"
+
+
+def iter_blockchain_records(offset=0):
+    """Stream (start offset, end offset, block) tuples starting at the given byte offset"""
+    for offset, line in iter_chain_lines(offset):
+        # A line without newline is a torn write from an interrupted append
+        if not line.endswith(b"\n"):
+            break
+        yield offset, offset + len(line), json.loads(line)
+
+
+def iter_blockchain():
+    """Stream the blocks of the chain one by one without loading the whole file"""
+    for _, _, block in iter_blockchain_records():
+        yield block
+
+
+def iter_block_readings(block):
+    """Readings stored in a block: one for a plain block, a whole batch for a Merkle block"""
+    data = block["data"]
+    if "readings" in data:
+        yield from data["readings"]
+    else:
+        yield {"timestamp": block["timestamp"], **data, "alert": block.get("alert", False)}
+
+
+def get_signal_values(reading):
+    return {
+        "frequency": reading["frequency"]["mean"],
+        "systolic": reading["pressure"]["mean"][0],
+        "diastolic": reading["pressure"]["mean"][1],
+        "oxygen": reading["oxygen"]["mean"],
+    }
+
+
+def read_index_tail():
+    """Number of indexed blocks and the byte offset where the last one ends"""
+    index_path = get_index_path()
+    if not os.path.exists(index_path):
+        return 0, 0
+    with open(index_path, "rb") as f:
+        entries = os.fstat(f.fileno()).st_size // INDEX_RECORD.size
+        if entries == 0:
+            return 0, 0
+        f.seek((entries - 1) * INDEX_RECORD.size)
+        offset, length = INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+    return entries, offset + length
+
+
+def read_index_entry(index):
+    with open(get_index_path(), "rb") as f:
+        f.seek(index * INDEX_RECORD.size)
+        return INDEX_RECORD.unpack(f.read(INDEX_RECORD.size))
+
+
+def locate_block(index):
+    """Byte offset and length of block #index, or None if it does not exist"""
+    if index < 0:
+        return None
+    entries, indexed_end = read_index_tail()
+    if index < entries:
+        return read_index_entry(index)
+
+    # Blocks past the end of the index (missing index or a write in progress)
+    # are found by scanning forward from the last indexed block
+    for i, (offset, next_offset, _) in enumerate(iter_blockchain_records(indexed_end), entries):
+        if i == index:
+            return offset, next_offset - offset
+    return None
+
+
+def get_block(index):
+    location = locate_block(index)
+    if location is None:
+        raise IndexError(f"block #{index} does not exist")
+    offset, length = location
+    return json.loads(read_chain_bytes(offset, length))
+
+
+def iter_blocks(start=0, stop=None):
+    """Stream blocks start..stop-1, seeking straight to the first one"""
+    if stop is not None and stop <= start:
+        return
+    location = locate_block(start)
+    if location is None:
+        return
+    for i, (_, _, block) in enumerate(iter_blockchain_records(location[0]), start):
+        if stop is not None and i >= stop:
+            break
+        yield block
+
+
+def count_time_entries():
+    time_index_path = get_time_index_path()
+    if not os.path.exists(time_index_path):
+        return 0
+    return os.path.getsize(time_index_path) // TIME_RECORD.size
+
+
+def get_block_time(index):
+    """Time index value of block #index: the latest block timestamp up to that block"""
+    if index < count_time_entries():
+        with open(get_time_index_path(), "rb") as f:
+            f.seek(index * TIME_RECORD.size)
+            return TIME_RECORD.unpack(f.read(TIME_RECORD.size))[0]
+    # Blocks not in the time index yet are read directly
+    return parse_timestamp(get_block(index)["timestamp"])
+
+
+def refresh_index():
+    """Catch up missing or stale indexes, each search step would scan the chain otherwise"""
+    if count_blocks() - count_time_entries() > INDEX_LAG:
+        ensure_index()
+
+
+def find_first_block_at(timestamp, start=0, stop=None):
+    """Binary search of the first block whose time index value is >= timestamp"""
+    refresh_index()
+    low = start
+    high = count_blocks() if stop is None else stop
+    while low < high:
+        middle = (low + high) // 2
+        if get_block_time(middle) < timestamp:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+def count_blocks():
+    entries, indexed_end = read_index_tail()
+    count = 0
+    # Normally nothing is left to scan after the last indexed block
+    for path, segment_start in iter_segment_files(indexed_end):
+        with open(path, "rb") as f:
+            f.seek(max(indexed_end - segment_start, 0))
+            while True:
+                chunk = f.read(1 << 20)
+                if not chunk:
+                    break
+                count += chunk.count(b"\n")
+    return entries + count
+
+
+def rebuild_index(blockchain_path=None):
+    blockchain_path = blockchain_path or get_blockchain_path()
+    index_path = get_index_path(blockchain_path)
+    time_index_path = get_time_index_path(blockchain_path)
+    block_time = float("-inf")
+
+    with open(index_path + ".tmp", "wb") as index, open(time_index_path + ".tmp", "wb") as time_index:
+        for offset, line in iter_chain_lines(0, blockchain_path):
+            if not line.endswith(b"\n"):
+                break
+            index.write(INDEX_RECORD.pack(offset, len(line)))
+            block_time = max(block_time, parse_timestamp(json.loads(line)["timestamp"]))
+            time_index.write(TIME_RECORD.pack(block_time))
+    os.replace(index_path + ".tmp", index_path)
+    os.replace(time_index_path + ".tmp", time_index_path)
+
+
+def ensure_index():
+    """Make the index match the chain file, it is rebuilt if missing or inconsistent"""
+    blockchain_path = get_blockchain_path()
+    index_path = get_index_path()
+    recover_segments()
+    if not os.path.exists(blockchain_path):
+        clear_blockchain()
+        return
+
+    chain_size = get_chain_size()
+    time_index_path = get_time_index_path()
+    if (
+        os.path.exists(index_path)
+        and os.path.exists(time_index_path)
+        and os.path.getsize(index_path) % INDEX_RECORD.size == 0
+        and os.path.getsize(time_index_path) % TIME_RECORD.size == 0
+    ):
+        entries, indexed_end = read_index_tail()
+        time_entries = count_time_entries()
+        if indexed_end <= chain_size and time_entries <= count_blocks():
+            # Index only the blocks appended after the last indexed one
+            with open(index_path, "ab") as index:
+                for offset, next_offset, _ in iter_blockchain_records(indexed_end):
+                    index.write(INDEX_RECORD.pack(offset, next_offset - offset))
+            extend_time_index(time_entries)
+            return
+
+    rebuild_index()
+
+
+def extend_time_index(time_entries):
+    block_time = get_block_time(time_entries - 1) if time_entries else float("-inf")
+    with open(get_time_index_path(), "ab") as time_index:
+        for block in iter_blocks(time_entries):
+            block_time = max(block_time, parse_timestamp(block["timestamp"]))
+            time_index.write(TIME_RECORD.pack(block_time))
+
+
+def load_blockchain():
+    return list(iter_blockchain())
 
 
 def save_blockchain(blockchain):
-    # Get the path to trabajo-practico-1 directory
-    base_path = os.path.dirname(os.path.dirname(__file__))
-    blockchain_path = os.path.join(base_path, "blockchain.json")
+    clear_blockchain()
+    blockchain_path = get_blockchain_path()
     with open(blockchain_path, "w") as f:
-        json.dump(blockchain, f, indent=2)
+        for block in blockchain:
+            f.write(encode_block(block))
+    rebuild_index()
+
+
+def remove_segments(blockchain_path=None):
+    """Delete the sealed segments of a chain and its segment list"""
+    for segment in load_segments(blockchain_path):
+        segment_path = get_segment_path(segment["segment"], blockchain_path)
+        if os.path.exists(segment_path):
+            os.remove(segment_path)
+    segments_path = get_segments_path(blockchain_path)
+    if os.path.exists(segments_path):
+        os.remove(segments_path)
 
 
 def clear_blockchain():
-    # Get the path to trabajo-practico-1 directory
-    base_path = os.path.dirname(os.path.dirname(__file__))
-    blockchain_path = os.path.join(base_path, "blockchain.json")
-    with open(blockchain_path, "w") as f:
-        json.dump([], f)
+    """Empty the chain, its segments, indexes, alert index and rollups"""
+    close_blockchain()
+    remove_segments()
+    for path in (get_blockchain_path(), get_index_path(), get_time_index_path()):
+        with open(path, "w"):
+            pass
+    # The alert index and the rollups describe the old chain too. Imported here
+    # because both modules build their paths from this one
+    from .alert_index import clear_alert_index
+    from .rollups import clear_rollups
+
+    clear_alert_index()
+    clear_rollups()
+
+
+class ChainWriter:
+    """Append-only writer of the chain and its indexes with group commit.
+
+    Durability modes:
+    - none: every block is handed to the OS, the chain is never fsynced
+    - count: fsync once every sync_every blocks
+    - interval: fsync at most sync_interval_ms after the first unsynced block
+    - block: fsync after every block
+
+    All the blocks written since the last fsync are committed by the next
+    one, so its cost is shared by blocks that arrive close together. Only the
+    chain is fsynced, a crash that leaves the indexes behind is repaired by
+    ensure_index. With a tracer, the latency from each stamp given to append
+    until its block is committed is recorded as end_to_end, and the fsync
+    time as fsync.
+
+    Once the active file reaches segment_size it is fsynced, its header is
+    appended to the segments manifest and it is renamed to a numbered sealed
+    segment (0 disables rotation).
+    """
+
+    def __init__(
+        self,
+        durability="none",
+        sync_every=100,
+        sync_interval_ms=10.0,
+        tracer=None,
+        segment_size=SEGMENT_SIZE,
+    ):
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"unknown durability mode {durability!r}")
+        self.durability = durability
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval_ms / 1000
+        self.tracer = tracer
+        self.segment_size = segment_size
+        self.syncs = 0
+
+        ensure_index()
+        time_entries = count_time_entries()
+        self.last_block_time = get_block_time(time_entries - 1) if time_entries else float("-inf")
+        self.chain = open(get_blockchain_path(), "ab")
+        self.index = open(get_index_path(), "ab")
+        self.time_index = open(get_time_index_path(), "ab")
+        self.offset = get_chain_size()
+        self.entries = read_index_tail()[0]
+        self.open_segment()
+
+        self.unsynced_blocks = 0
+        self.unsynced_stamps = []
+        self.first_unsynced = None
+
+    def open_segment(self):
+        """Digest and first previous hash of the active segment, from the bytes already in it"""
+        segments = load_segments()
+        self.segment_start = get_active_start(segments)
+        self.segment_blocks = self.entries - (segments[-1]["last_index"] + 1 if segments else 0)
+        self.segment_digest = hashlib.sha256()
+        self.segment_prev_hash = None
+        # Set by every append, a segment is only sealed right after one
+        self.last_hash = None
+
+        # Only the first line is parsed, the rest is hashed as raw bytes
+        with open(get_blockchain_path(), "rb") as f:
+            first_line = f.readline()
+            if first_line.endswith(b"\n"):
+                self.segment_prev_hash = json.loads(first_line)["prev_hash"]
+            f.seek(0)
+            remaining = self.offset - self.segment_start
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                self.segment_digest.update(chunk)
+                remaining -= len(chunk)
+
+    def append(self, block, started_ns=()):
+        record = encode_block(block).encode()
+        self.chain.write(record)
+        # The chain is written first, a crash in between leaves a short index that is caught up later
+        self.chain.flush()
+        self.index.write(INDEX_RECORD.pack(self.offset, len(record)))
+        self.index.flush()
+        self.offset += len(record)
+        self.entries += 1
+
+        if not self.segment_blocks:
+            self.segment_prev_hash = block["prev_hash"]
+        self.last_hash = block["hash"]
+        self.segment_digest.update(record)
+        self.segment_blocks += 1
+
+        self.last_block_time = max(self.last_block_time, parse_timestamp(block["timestamp"]))
+        self.time_index.write(TIME_RECORD.pack(self.last_block_time))
+        self.time_index.flush()
+
+        if not self.unsynced_blocks:
+            self.first_unsynced = time.monotonic()
+        self.unsynced_blocks += 1
+        self.unsynced_stamps.extend(started_ns)
+        self.poll()
+
+        if self.segment_size and self.offset - self.segment_start >= self.segment_size:
+            self.seal_segment()
+
+    def seal_segment(self):
+        # The header is only written once the whole segment is on disk
+        self.commit()
+        segments = load_segments()
+        number = len(segments)
+        header = {
+            "segment": number,
+            "first_index": self.entries - self.segment_blocks,
+            "last_index": self.entries - 1,
+            "start_offset": self.segment_start,
+            "size": self.offset - self.segment_start,
+            "first_prev_hash": self.segment_prev_hash,
+            "last_hash": self.last_hash,
+            "digest": self.segment_digest.hexdigest(),
+        }
+        with open(get_segments_path(), "ab") as f:
+            f.write(encode_block(header).encode())
+            f.flush()
+            os.fsync(f.fileno())
+
+        # A crash before the rename is finished by recover_segments
+        self.chain.close()
+        os.replace(get_blockchain_path(), get_segment_path(number))
+        self.chain = open(get_blockchain_path(), "ab")
+        self.open_segment()
+
+    def sync_deadline(self):
+        """Monotonic time the pending blocks must be committed by, None if nothing waits for it"""
+        if self.durability != "interval" or not self.unsynced_blocks:
+            return None
+        return self.first_unsynced + self.sync_interval
+
+    def poll(self):
+        # Called after every append and by an idle caller, so interval mode never waits for a next block
+        if not self.unsynced_blocks:
+            return
+        if self.durability == "none":
+            self.commit(fsync=False)
+        elif (
+            self.durability == "block"
+            or (self.durability == "count" and self.unsynced_blocks >= self.sync_every)
+            or (self.durability == "interval" and time.monotonic() >= self.sync_deadline())
+        ):
+            self.commit()
+
+    def commit(self, fsync=True):
+        if fsync:
+            start_ns = time.monotonic_ns()
+            os.fsync(self.chain.fileno())
+            self.syncs += 1
+            if self.tracer is not None:
+                self.tracer.record("fsync", time.monotonic_ns() - start_ns)
+
+        if self.tracer is not None:
+            committed_ns = time.monotonic_ns()
+            for started_ns in self.unsynced_stamps:
+                self.tracer.record("end_to_end", committed_ns - started_ns)
+        self.unsynced_blocks = 0
+        self.unsynced_stamps = []
+        self.first_unsynced = None
+
+    def close(self):
+        if self.unsynced_blocks:
+            self.commit(fsync=self.durability != "none")
+        for f in (self.chain, self.index, self.time_index):
+            f.close()
+
+
+def find_line_start(f, end):
+    """Offset where the line that ends at end starts, scanning backwards from end"""
+    position = end
+    while position > 0:
+        chunk_start = max(position - TAIL_CHUNK, 0)
+        f.seek(chunk_start)
+        newline = f.read(position - chunk_start).rfind(b"\n")
+        if newline != -1:
+            return chunk_start + newline + 1
+        position = chunk_start
+    return 0
+
+
+def read_last_block(path):
+    with open(path, "rb") as f:
+        end = os.fstat(f.fileno()).st_size
+        start = find_line_start(f, end - 1)
+        f.seek(start)
+        return json.loads(f.read(end - start))
+
+
+def trim_indexes(chain_size):
+    """Drop index and time index entries of blocks that are no longer in the chain"""
+    entries = read_index_tail()[0]
+    while entries and sum(read_index_entry(entries - 1)) > chain_size:
+        entries -= 1
+    if os.path.exists(get_index_path()):
+        with open(get_index_path(), "rb+") as f:
+            f.truncate(entries * INDEX_RECORD.size)
+    if count_time_entries() > entries:
+        with open(get_time_index_path(), "rb+") as f:
+            f.truncate(entries * TIME_RECORD.size)
+
+
+def recover_blockchain():
+    """Cut a torn write off the end of the chain and return its last block (None if empty).
+
+    Only the tail of the active segment is read, scanning backwards from the
+    end of the file, and the indexes are trimmed from their end, so the time
+    does not depend on the length of the chain.
+    """
+    close_blockchain()
+    recover_segments()
+    blockchain_path = get_blockchain_path()
+    if not os.path.exists(blockchain_path):
+        clear_blockchain()
+        return None
+
+    last_block = None
+    with open(blockchain_path, "rb+") as f:
+        # Whatever follows the last newline is an append that never finished
+        end = find_line_start(f, os.fstat(f.fileno()).st_size)
+        while end > 0:
+            start = find_line_start(f, end - 1)
+            f.seek(start)
+            try:
+                last_block = json.loads(f.read(end - start))
+                break
+            except ValueError:
+                end = start
+        f.truncate(end)
+
+    segments = load_segments()
+    trim_indexes(get_active_start(segments) + end)
+    if last_block is None and segments:
+        last_block = read_last_block(get_segment_path(segments[-1]["segment"]))
+    return last_block
+
+
+def close_blockchain():
+    global writer
+    if writer is not None:
+        writer.close()
+        writer = None
+
+
+def append_block(block):
+    global writer
+    if writer is None:
+        writer = ChainWriter()
+    writer.append(block)
 
 
 def add_block_to_chain(blockchain, block):
+    # Only the new block is written, the file is never rewritten
     blockchain.append(block)
-    save_blockchain(blockchain)
-    return len(blockchain) - 1
\ No newline at end of file
+    append_block(block)
+    return len(blockchain) - 1
+
+
+def convert_legacy_blockchain(source_path=None, target_path=None):
+    """Convert a blockchain.json array into the append-only log format"""
+    source_path = source_path or get_blockchain_path(LEGACY_BLOCKCHAIN_FILE)
+    target_path = target_path or get_blockchain_path()
+
+    with open(source_path, "r") as f:
+        blockchain = json.load(f)
+
+    # Write to a temporary file first so a failed conversion never leaves half a log
+    tmp_path = target_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        for block in blockchain:
+            f.write(encode_block(block))
+    # The converted chain replaces every segment of the one at the target
+    if os.path.abspath(target_path) == os.path.abspath(get_blockchain_path()):
+        clear_blockchain()
+    else:
+        from .rollups import clear_rollups, get_rollups_path
+
+        remove_segments(target_path)
+        rollups_path = get_rollups_path(target_path)
+        if os.path.exists(rollups_path):
+            clear_rollups(rollups_path)
+    os.replace(tmp_path, target_path)
+    rebuild_index(target_path)
+
+    return len(blockchain)
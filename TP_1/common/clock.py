@@ -0,0 +1,24 @@
+import time
+from datetime import datetime
+
+# Wall clock in integer nanoseconds, cheap enough for every raw block and analyzer result
+now_ns = time.time_ns
+
+# Seconds since the epoch of the cached prefix and the prefix itself
+cached_second = None
+cached_prefix = ""
+
+
+def format_timestamp(timestamp_ns):
+    """ISO 8601 local time with microseconds, e.g. 2025-01-01T02:00:00.123456.
+
+    Only the "YYYY-MM-DDTHH:MM:SS" prefix goes through datetime, once per
+    second: readings arrive in time order, so nearly every call reuses it and
+    only appends the fraction.
+    """
+    global cached_second, cached_prefix
+    second, fraction_ns = divmod(timestamp_ns, 1_000_000_000)
+    if second != cached_second:
+        cached_prefix = datetime.fromtimestamp(second).strftime("%Y-%m-%dT%H:%M:%S")
+        cached_second = second
+    return f"{cached_prefix}.{fraction_ns // 1000:06d}"
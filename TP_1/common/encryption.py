@@ -1,6 +1,53 @@
 import hashlib
+import struct
 
+# Version 1 hashes str(data), version 2 a fixed binary layout of the same values
+# and version 3 the Merkle root of a batch of readings
+LEGACY_HASH_VERSION = 1
+HASH_VERSION = 2
+MERKLE_HASH_VERSION = 3
 
-def calculate_block_hash(previous_hash, data, timestamp):
-    hash_input = previous_hash + str(data) + timestamp
-    return hashlib.sha256(hash_input.encode()).hexdigest()
+# patient_id, frequency mean/std, systolic mean/std, diastolic mean/std, oxygen mean/std
+DATA_LAYOUT_V2 = struct.Struct("<q8d")
+HEADER_V2 = b"TP1-BLOCK\x00\x02"
+HEADER_V3 = b"TP1-BLOCK\x00\x03"
+
+
+def encode_block_data(data):
+    frequency = data["frequency"]
+    pressure = data["pressure"]
+    oxygen = data["oxygen"]
+    return DATA_LAYOUT_V2.pack(
+        data.get("patient_id", 0),
+        frequency["mean"],
+        frequency["std_dev"],
+        pressure["mean"][0],
+        pressure["std_dev"][0],
+        pressure["mean"][1],
+        pressure["std_dev"][1],
+        oxygen["mean"],
+        oxygen["std_dev"],
+    )
+
+
+def calculate_block_hash(previous_hash, data, timestamp, version=LEGACY_HASH_VERSION):
+    if version == LEGACY_HASH_VERSION:
+        hash_input = previous_hash + str(data) + timestamp
+        return hashlib.sha256(hash_input.encode()).hexdigest()
+
+    if version == HASH_VERSION:
+        hasher = hashlib.sha256(HEADER_V2)
+        # NUL terminator: hex hashes never contain it, so the fields cannot run together
+        hasher.update(previous_hash.encode() + b"\x00")
+        hasher.update(encode_block_data(data))
+        hasher.update(timestamp.encode())
+        return hasher.hexdigest()
+
+    if version == MERKLE_HASH_VERSION:
+        hasher = hashlib.sha256(HEADER_V3)
+        hasher.update(previous_hash.encode() + b"\x00")
+        hasher.update(bytes.fromhex(data["merkle_root"]))
+        hasher.update(timestamp.encode())
+        return hasher.hexdigest()
+
+    raise ValueError(f"unknown block hash version: {version}")
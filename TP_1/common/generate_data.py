@@ -1,5 +1,5 @@
 import random
-from datetime import datetime
+from .clock import now_ns, format_timestamp
 
 
 def generate_random_number(min_val, max_val):
@@ -7,4 +7,5 @@ def generate_random_number(min_val, max_val):
 
 
 def get_current_timestamp():
-    return datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
\ No newline at end of file
+    # Hot paths keep now_ns() and format at the edges instead
+    return format_timestamp(now_ns())
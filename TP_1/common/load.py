@@ -0,0 +1,115 @@
+import time
+from .blockchain import DURABILITY_MODES, SEGMENT_SIZE
+
+
+class LoadSchedule:
+    """When each raw block of the load generator is due, shared by main.py and async_main.py.
+
+    Open loop: block k is due at start + k / rate, whether or not the pipeline
+    keeps up, and the lag behind that schedule is measured. A rate of 0 sends
+    as fast as possible. The runner takes the closed-loop credit, sleeps the
+    delay with its own sleep and sends the block.
+    """
+
+    def __init__(self, rate=0.0, blocks=None, duration=None):
+        self.interval = 1 / rate if rate else 0.0
+        self.blocks = blocks
+        self.duration = duration
+        self.start = time.monotonic()
+        self.sent = 0
+        self.max_lag = 0.0
+
+    def running(self):
+        if self.blocks is not None and self.sent >= self.blocks:
+            return False
+        return self.duration is None or time.monotonic() - self.start < self.duration
+
+    def delay(self):
+        """Seconds until the next block is due, 0 when it is late"""
+        if not self.interval:
+            return 0.0
+        delay = self.start + self.sent * self.interval - time.monotonic()
+        if delay > 0:
+            return delay
+        self.max_lag = max(self.max_lag, -delay)
+        return 0.0
+
+    def finish(self):
+        elapsed = time.monotonic() - self.start
+        print(
+            f"Generator: {self.sent} blocks sent in {elapsed:.2f}s "
+            f"({self.sent / elapsed if elapsed else 0:.0f} blocks/s sent)"
+            + (f", max lag behind schedule {self.max_lag * 1000:.1f} ms" if self.interval else "")
+        )
+        return self.sent, self.max_lag
+
+
+def add_durability_arguments(parser):
+    storage = parser.add_argument_group("durability", "when the verifier fsyncs the chain")
+    storage.add_argument(
+        "--durability",
+        choices=DURABILITY_MODES,
+        default="none",
+        help="none: never fsync, count: every --sync-every blocks, "
+        "interval: --sync-interval-ms after the first unsynced block, block: every block",
+    )
+    storage.add_argument("--sync-every", type=int, default=100, help="blocks per fsync in count mode")
+    storage.add_argument(
+        "--sync-interval-ms", type=float, default=10.0, help="maximum fsync delay in interval mode"
+    )
+    storage.add_argument(
+        "--write-queue",
+        type=int,
+        default=1024,
+        help="chained blocks waiting for the writer thread before the verifier stops reading results",
+    )
+    storage.add_argument(
+        "--segment-mb",
+        type=float,
+        default=SEGMENT_SIZE / (1 << 20),
+        help="size in MiB at which the active chain file is sealed as a segment (0 never rotates)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="continue the existing chain after its last valid block instead of starting a new one",
+    )
+
+
+def add_load_arguments(parser):
+    load = parser.add_argument_group(
+        "load generator", "any of --rate, --blocks or --duration replaces the 60 samples at 1 per second"
+    )
+    load.add_argument("--rate", type=float, help="target raw blocks per second, 0 for as fast as possible")
+    load.add_argument("--blocks", type=int, help="stop after this many raw blocks")
+    load.add_argument("--duration", type=float, help="stop after this many seconds")
+    load.add_argument(
+        "--pacing",
+        choices=["open", "closed"],
+        default="open",
+        help="open: send on schedule regardless of progress, closed: at most --window blocks in flight",
+    )
+    load.add_argument("--window", type=int, default=1000, help="blocks in flight in closed-loop pacing")
+
+
+def get_durability_options(args):
+    """run_pipeline and run_async_pipeline keyword arguments of add_durability_arguments"""
+    return {
+        "durability": args.durability,
+        "sync_every": args.sync_every,
+        "sync_interval_ms": args.sync_interval_ms,
+        "write_queue_size": args.write_queue,
+        "segment_size": int(args.segment_mb * (1 << 20)),
+        "resume": args.resume,
+    }
+
+
+def get_load_options(args):
+    """run_pipeline and run_async_pipeline keyword arguments of add_load_arguments"""
+    return {
+        "rate": args.rate,
+        "blocks": args.blocks,
+        "duration": args.duration,
+        "pacing": args.pacing,
+        "window": args.window,
+    }
@@ -0,0 +1,57 @@
+import hashlib
+from .encryption import encode_block_data
+
+# Domain separation so a leaf can never be passed off as an inner node
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+
+
+def hash_reading(reading):
+    hasher = hashlib.sha256(LEAF_PREFIX)
+    hasher.update(encode_block_data(reading))
+    hasher.update(b"\x01" if reading["alert"] else b"\x00")
+    hasher.update(reading["timestamp"].encode())
+    return hasher.digest()
+
+
+def hash_node(left, right):
+    return hashlib.sha256(NODE_PREFIX + left + right).digest()
+
+
+def next_level(level):
+    # An odd node is promoted unchanged instead of being paired with itself
+    parents = [hash_node(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+    if len(level) % 2:
+        parents.append(level[-1])
+    return parents
+
+
+def merkle_root(readings):
+    level = [hash_reading(reading) for reading in readings]
+    if not level:
+        raise ValueError("a Merkle tree needs at least one reading")
+    while len(level) > 1:
+        level = next_level(level)
+    return level[0].hex()
+
+
+def merkle_proof(readings, index):
+    """Sibling path from the reading at `index` up to the root, as (side, hash) pairs"""
+    level = [hash_reading(reading) for reading in readings]
+    proof = []
+    while len(level) > 1:
+        sibling = index ^ 1
+        if sibling < len(level):
+            side = "left" if sibling < index else "right"
+            proof.append((side, level[sibling].hex()))
+        level = next_level(level)
+        index //= 2
+    return proof
+
+
+def verify_merkle_proof(reading, proof, root):
+    node = hash_reading(reading)
+    for side, sibling_hex in proof:
+        sibling = bytes.fromhex(sibling_hex)
+        node = hash_node(sibling, node) if side == "left" else hash_node(node, sibling)
+    return node.hex() == root
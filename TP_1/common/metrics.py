@@ -0,0 +1,120 @@
+import os
+import resource
+import signal
+import sys
+import time
+
+
+class LatencyHistogram:
+    """Log-linear histogram of nanosecond latencies in constant memory.
+
+    Each power of two is split in 32 buckets, so percentiles are within ~3%
+    of the exact value no matter how many samples are recorded.
+    """
+
+    SUB_BUCKET_BITS = 5
+
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, value_ns):
+        value_ns = max(int(value_ns), 0)
+        shift = max(value_ns.bit_length() - self.SUB_BUCKET_BITS, 0)
+        key = (shift, value_ns >> shift)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        self.count += 1
+        self.total += value_ns
+        if value_ns > self.max:
+            self.max = value_ns
+
+    def merge(self, other):
+        for key, count in other.counts.items():
+            self.counts[key] = self.counts.get(key, 0) + count
+        self.count += other.count
+        self.total += other.total
+        self.max = max(self.max, other.max)
+
+    def percentile(self, fraction):
+        if self.count == 0:
+            return 0
+        target = fraction * self.count
+        seen = 0
+        for shift, value in sorted(self.counts, key=lambda key: key[1] << key[0]):
+            seen += self.counts[(shift, value)]
+            if seen >= target:
+                # Middle of the bucket, never above the largest recorded value
+                return min(((value << shift) + ((value + 1) << shift)) // 2, self.max)
+        return self.max
+
+    def summary(self):
+        to_ms = 1e-6
+        return {
+            "count": self.count,
+            "mean_ms": (self.total / self.count) * to_ms if self.count else 0.0,
+            "p50_ms": self.percentile(0.50) * to_ms,
+            "p95_ms": self.percentile(0.95) * to_ms,
+            "p99_ms": self.percentile(0.99) * to_ms,
+            "max_ms": self.max * to_ms,
+        }
+
+
+class StageTracer:
+    """Latency histograms of the pipeline stages seen by one process"""
+
+    def __init__(self, name):
+        self.name = name
+        self.stages = {}
+
+    def record(self, stage, elapsed_ns):
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = LatencyHistogram()
+        histogram.record(elapsed_ns)
+
+    def merge(self, other):
+        for stage, histogram in other.stages.items():
+            self.stages.setdefault(stage, LatencyHistogram()).merge(histogram)
+
+    def summary(self):
+        # A copy, other threads of the process may add stages meanwhile
+        return {stage: histogram.summary() for stage, histogram in list(self.stages.items())}
+
+    def dump(self, file=None):
+        file = file or sys.stderr
+        for stage, summary in self.summary().items():
+            print(
+                f"[trace {self.name} pid={os.getpid()}] {stage}: {summary['count']} samples, "
+                f"p50 {summary['p50_ms']:.3f} ms, p95 {summary['p95_ms']:.3f} ms, "
+                f"p99 {summary['p99_ms']:.3f} ms, max {summary['max_ms']:.3f} ms",
+                file=file,
+                flush=True,
+            )
+
+    def install_signal(self):
+        # kill -USR1 <pid> prints the histograms collected so far without stopping the process
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.dump())
+
+
+def process_usage():
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        "pid": os.getpid(),
+        "cpu_user_s": usage.ru_utime,
+        "cpu_system_s": usage.ru_stime,
+        # ru_maxrss is in kilobytes on Linux
+        "max_rss_kb": usage.ru_maxrss,
+    }
+
+
+def run_stage(stage, stats_queue, target, *args, **kwargs):
+    """Process target wrapper that reports the stage result, CPU time and peak RSS"""
+    start = time.monotonic()
+    result = target(*args, **kwargs)
+    stats_queue.put(
+        {"stage": stage, "wall_s": time.monotonic() - start, **process_usage(), "result": result}
+    )
+    return result
@@ -0,0 +1,133 @@
+import struct
+from multiprocessing import Semaphore
+from multiprocessing.shared_memory import SharedMemory
+
+# kind, seq, generated_ns, patient_id, timestamp_ns, frequency, systolic, diastolic, oxygen
+RECORD_FORMAT = "<Bqqqqiiii"
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+
+RECORD_DATA = 1
+RECORD_END = 2
+
+
+def encode_raw_block(data_block):
+    if data_block is None:
+        return struct.pack(RECORD_FORMAT, RECORD_END, 0, 0, 0, 0, 0, 0, 0, 0)
+    systolic, diastolic = data_block["pressure"]
+    return struct.pack(
+        RECORD_FORMAT,
+        RECORD_DATA,
+        data_block["seq"],
+        data_block["generated_ns"],
+        data_block["patient_id"],
+        data_block["timestamp_ns"],
+        data_block["frequency"],
+        systolic,
+        diastolic,
+        data_block["oxygen"],
+    )
+
+
+def decode_raw_block(record):
+    (
+        kind,
+        seq,
+        generated_ns,
+        patient_id,
+        timestamp_ns,
+        frequency,
+        systolic,
+        diastolic,
+        oxygen,
+    ) = struct.unpack(RECORD_FORMAT, record)
+    if kind == RECORD_END:
+        return None
+    return {
+        "seq": seq,
+        "generated_ns": generated_ns,
+        "patient_id": patient_id,
+        "timestamp_ns": timestamp_ns,
+        "frequency": frequency,
+        "pressure": [systolic, diastolic],
+        "oxygen": oxygen,
+    }
+
+
+class BroadcastRing:
+    """Single producer, multiple consumer ring of raw blocks in shared memory.
+
+    Every block is encoded once into a fixed-size slot and each reader
+    consumes every slot at its own cursor. Per reader there is a pair of
+    semaphores: `items` counts the slots the reader has not consumed yet and
+    `space` the slots the writer may still fill, so the writer blocks when the
+    slowest reader is a full ring behind.
+    """
+
+    def __init__(self, readers, slots=1024):
+        self.slots = slots
+        self.shm = SharedMemory(create=True, size=slots * RECORD_SIZE)
+        self.items = [Semaphore(0) for _ in range(readers)]
+        self.space = [Semaphore(slots) for _ in range(readers)]
+        self.position = 0
+
+    def reader(self, index):
+        return RingReader(self.shm.name, self.slots, self.items[index], self.space[index])
+
+    def send(self, data_block):
+        for space in self.space:
+            space.acquire()
+
+        offset = self.position * RECORD_SIZE
+        self.shm.buf[offset:offset + RECORD_SIZE] = encode_raw_block(data_block)
+        self.position = (self.position + 1) % self.slots
+
+        for items in self.items:
+            items.release()
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+class RingReader:
+    """Reading end of a BroadcastRing, with the recv/poll interface of a Pipe connection"""
+
+    def __init__(self, shm_name, slots, items, space):
+        self.shm_name = shm_name
+        self.slots = slots
+        self.items = items
+        self.space = space
+        self.position = 0
+        self.ready = False
+        self.shm = None
+
+    def __getstate__(self):
+        # The shared memory is attached again by name in the child process
+        state = self.__dict__.copy()
+        state["shm"] = None
+        return state
+
+    def poll(self, timeout=0.0):
+        if not self.ready:
+            self.ready = self.items.acquire(timeout=timeout)
+        return self.ready
+
+    def recv(self):
+        if not self.ready:
+            self.items.acquire()
+        self.ready = False
+
+        if self.shm is None:
+            self.shm = SharedMemory(name=self.shm_name)
+
+        offset = self.position * RECORD_SIZE
+        record = bytes(self.shm.buf[offset:offset + RECORD_SIZE])
+        self.position = (self.position + 1) % self.slots
+        self.space.release()
+
+        return decode_raw_block(record)
+
+    def close(self):
+        if self.shm is not None:
+            self.shm.close()
+            self.shm = None
@@ -0,0 +1,272 @@
+import math
+import os
+import struct
+from .blockchain import get_blockchain_path
+
+# Bucket sizes in seconds, aligned to the epoch (UTC days)
+ROLLUP_RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# "block" aggregates whole blocks: its value is the number of readings and its
+# alerts the blocks flagged as alert; the others aggregate the reading means
+ROLLUP_SIGNALS = ("block", "frequency", "systolic", "diastolic", "oxygen")
+
+# resolution, signal, bucket start, count, sum, sum of squares, min, max, alerts.
+# Records of the same bucket are partial and add up. A record whose signal is
+# COMMIT closes a flush: its count is the number of chain blocks covered so far.
+ROLLUP_RECORD = struct.Struct("<BBqQddddQ")
+COMMIT = 0xFF
+
+RESOLUTION_CODES = {name: code for code, name in enumerate(ROLLUP_RESOLUTIONS)}
+RESOLUTION_SIZES = tuple(ROLLUP_RESOLUTIONS.values())
+SIGNAL_CODES = {signal: code for code, signal in enumerate(ROLLUP_SIGNALS)}
+
+
+def get_rollups_path(blockchain_path=None):
+    blockchain_path = blockchain_path or get_blockchain_path()
+    return os.path.splitext(blockchain_path)[0] + ".rollups"
+
+
+def new_bucket():
+    return {"count": 0, "total": 0.0, "sumsq": 0.0, "min": math.inf, "max": -math.inf, "alerts": 0}
+
+
+def merge_bucket(bucket, other):
+    bucket["count"] += other["count"]
+    bucket["total"] += other["total"]
+    bucket["sumsq"] += other["sumsq"]
+    bucket["min"] = min(bucket["min"], other["min"])
+    bucket["max"] = max(bucket["max"], other["max"])
+    bucket["alerts"] += other["alerts"]
+    return bucket
+
+
+def describe_bucket(bucket):
+    """Mean and population standard deviation from the sums, min, max and alerts of a bucket"""
+    count = bucket["count"]
+    mean = bucket["total"] / count if count else 0.0
+    variance = bucket["sumsq"] / count - mean * mean if count else 0.0
+    return {
+        "count": count,
+        "mean": mean,
+        "std_dev": math.sqrt(max(variance, 0.0)),
+        "min": bucket["min"] if count else None,
+        "max": bucket["max"] if count else None,
+        "alerts": bucket["alerts"],
+    }
+
+
+def pack_bucket(key, bucket):
+    resolution, start, signal = key
+    return ROLLUP_RECORD.pack(
+        resolution,
+        signal,
+        start,
+        bucket["count"],
+        bucket["total"],
+        bucket["sumsq"],
+        bucket["min"],
+        bucket["max"],
+        bucket["alerts"],
+    )
+
+
+def pack_commit(block_count):
+    return ROLLUP_RECORD.pack(0, COMMIT, 0, block_count, 0.0, 0.0, 0.0, 0.0, 0)
+
+
+def read_committed(path=None):
+    """Records up to the last complete flush and the number of blocks they cover"""
+    path = path or get_rollups_path()
+    if not os.path.exists(path):
+        return b"", 0
+    with open(path, "rb") as f:
+        content = f.read()
+    # A flush cut short leaves records after its last COMMIT, they do not count
+    end = len(content) - len(content) % ROLLUP_RECORD.size
+    while end:
+        record = ROLLUP_RECORD.unpack_from(content, end - ROLLUP_RECORD.size)
+        if record[1] == COMMIT:
+            return content[:end], record[3]
+        end -= ROLLUP_RECORD.size
+    return b"", 0
+
+
+def load_rollups(resolution=None, path=None, pending=None, content=None):
+    """Merged buckets {(resolution name, start, signal): bucket} of the committed records.
+
+    content is the committed part of the file when the caller already read it.
+    pending is a RollupBuckets with the blocks those records do not cover yet,
+    added in memory: readers never write the file, only the verifier does.
+    """
+    if content is None:
+        content, _ = read_committed(path)
+    resolutions = list(ROLLUP_RESOLUTIONS)
+    code = None if resolution is None else RESOLUTION_CODES[resolution]
+    buckets = {}
+    for record in ROLLUP_RECORD.iter_unpack(content):
+        resolution_code, signal, start, count, total, sumsq, low, high, alerts = record
+        if signal == COMMIT or (code is not None and resolution_code != code):
+            continue
+        key = (resolutions[resolution_code], start, ROLLUP_SIGNALS[signal])
+        bucket = {"count": count, "total": total, "sumsq": sumsq, "min": low, "max": high, "alerts": alerts}
+        if key in buckets:
+            merge_bucket(buckets[key], bucket)
+        else:
+            buckets[key] = bucket
+    if pending is not None:
+        for (resolution_code, start, signal), bucket in pending.buckets.items():
+            if code is not None and resolution_code != code:
+                continue
+            key = (resolutions[resolution_code], start, ROLLUP_SIGNALS[signal])
+            merge_bucket(buckets.setdefault(key, new_bucket()), bucket)
+    return buckets
+
+
+def count_rollup_blocks(path=None):
+    return read_committed(path)[1]
+
+
+def compact_rollups(path=None):
+    """Rewrite the committed records with one record per bucket"""
+    path = path or get_rollups_path()
+    _, block_count = read_committed(path)
+    buckets = load_rollups(path=path)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        for (resolution, start, signal), bucket in sorted(buckets.items()):
+            key = (RESOLUTION_CODES[resolution], start, SIGNAL_CODES[signal])
+            f.write(pack_bucket(key, bucket))
+        f.write(pack_commit(block_count))
+    os.replace(tmp_path, path)
+    return len(buckets)
+
+
+def trim_rollups(block_count, path=None):
+    """Drop the flushes that cover blocks >= block_count, reading the file from its end"""
+    path = path or get_rollups_path()
+    if not os.path.exists(path):
+        return 0
+    record_size = ROLLUP_RECORD.size
+    with open(path, "rb+") as f:
+        end = os.fstat(f.fileno()).st_size // record_size * record_size
+        while end:
+            f.seek(end - record_size)
+            record = ROLLUP_RECORD.unpack(f.read(record_size))
+            if record[1] == COMMIT and record[3] <= block_count:
+                break
+            end -= record_size
+        f.truncate(end)
+        f.seek(end - record_size if end else 0)
+        return ROLLUP_RECORD.unpack(f.read(record_size))[3] if end else 0
+
+
+def clear_rollups(path=None):
+    with open(path or get_rollups_path(), "w"):
+        pass
+
+
+def summarize_rollups(start=None, end=None, path=None, pending=None, content=None):
+    """Per signal aggregate of the readings in [start, end) (epoch seconds, None for open).
+
+    Each bucket is taken from the coarsest resolution that lies inside the
+    range, so the cost is the number of buckets, not of readings. The edges
+    are rounded to whole minutes.
+    """
+    start = -math.inf if start is None else start - start % 60
+    end = math.inf if end is None else end - end % 60 + (60 if end % 60 else 0)
+    hour, day = ROLLUP_RESOLUTIONS["hour"], ROLLUP_RESOLUTIONS["day"]
+
+    def inside(bucket_start, size):
+        return bucket_start >= start and bucket_start + size <= end
+
+    totals = {signal: new_bucket() for signal in ROLLUP_SIGNALS}
+    buckets = load_rollups(path=path, pending=pending, content=content)
+    for (resolution, bucket_start, signal), bucket in buckets.items():
+        if resolution == "day":
+            use = inside(bucket_start, day)
+        elif resolution == "hour":
+            use = inside(bucket_start, hour) and not inside(bucket_start - bucket_start % day, day)
+        else:
+            use = inside(bucket_start, 60) and not inside(bucket_start - bucket_start % hour, hour)
+        if use:
+            merge_bucket(totals[signal], bucket)
+    return totals
+
+
+class RollupBuckets:
+    """Minute, hour and day buckets of every signal, aggregated in memory"""
+
+    def __init__(self, block_count=0):
+        self.blocks = block_count
+        self.buckets = {}
+
+    def add(self, time_s, signal, value, alert=False):
+        signal_code = SIGNAL_CODES[signal]
+        for resolution, size in enumerate(RESOLUTION_SIZES):
+            key = (resolution, int(time_s // size * size), signal_code)
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = new_bucket()
+            bucket["count"] += 1
+            bucket["total"] += value
+            bucket["sumsq"] += value * value
+            if value < bucket["min"]:
+                bucket["min"] = value
+            if value > bucket["max"]:
+                bucket["max"] = value
+            if alert:
+                bucket["alerts"] += 1
+
+    def add_block(self, index, block_time, readings, alert=False):
+        """Aggregate block #index: readings are (time, {signal: value}, alert causes)"""
+        self.add(block_time, "block", len(readings), alert)
+        for time_s, values, causes in readings:
+            for signal, value in values.items():
+                self.add(time_s, signal, value, signal in causes)
+        self.blocks = index + 1
+
+
+class RollupWriter(RollupBuckets):
+    """Minute, hour and day buckets of every signal, kept up to date as blocks are appended.
+
+    Buckets are accumulated in memory and flushed as partial records, followed
+    by a COMMIT with the number of blocks covered, whenever a block opens a new
+    minute and on close. A crash loses at most the minute being filled, which
+    trim_rollups and a replay of the chain from the COMMIT restore. The file
+    is compacted to one record per bucket on close and whenever the partial
+    records outnumber the compacted ones.
+    """
+
+    def __init__(self, block_count=None, path=None):
+        self.path = path or get_rollups_path()
+        super().__init__(count_rollup_blocks(self.path) if block_count is None else block_count)
+        self.minute = None
+        self.compacted = 0
+        self.partial = 0
+
+    def add_block(self, index, block_time, readings, alert=False):
+        minute = block_time // 60
+        if self.minute is not None and minute > self.minute and self.buckets:
+            self.flush()
+        if self.minute is None or minute > self.minute:
+            self.minute = minute
+        super().add_block(index, block_time, readings, alert)
+
+    def flush(self):
+        records = [pack_bucket(key, bucket) for key, bucket in self.buckets.items()]
+        records.append(pack_commit(self.blocks))
+        with open(self.path, "ab") as f:
+            f.write(b"".join(records))
+        self.buckets = {}
+        self.partial += len(records)
+        if self.partial > max(self.compacted, 4096):
+            self.compact()
+
+    def compact(self):
+        self.compacted = compact_rollups(self.path)
+        self.partial = 0
+
+    def close(self):
+        if self.buckets:
+            self.flush()
+        self.compact()
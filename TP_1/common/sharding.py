@@ -0,0 +1,6 @@
+import zlib
+
+
+def get_shard(patient_id, shard_count):
+    # crc32 is stable across processes and runs, unlike the built-in hash() of str
+    return zlib.crc32(str(patient_id).encode()) % shard_count
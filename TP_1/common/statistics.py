@@ -5,4 +5,67 @@ def calculate_mean(values):
 def calculate_standard_deviation(values):
     mean = calculate_mean(values)
     variance = sum((x - mean) ** 2 for x in values) / len(values)
-    return variance ** 0.5
\ No newline at end of file
+    return variance ** 0.5
+
+
+class RollingWindow:
+    """Mean and standard deviation of the last `size` values with O(1) updates.
+
+    Values live in a preallocated ring buffer. Mean and sum of squared
+    deviations are updated with Welford's formulas for adding and replacing
+    a value, and recomputed from the buffer once every few laps to stop
+    floating point drift from accumulating.
+    """
+
+    def __init__(self, size=30):
+        if size < 1:
+            raise ValueError("window size must be at least 1")
+        self.size = size
+        self.values = [0.0] * size
+        self.position = 0
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.updates = 0
+
+    def add(self, value):
+        if self.count < self.size:
+            self.count += 1
+            delta = value - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (value - self.mean)
+        else:
+            old_value = self.values[self.position]
+            old_mean = self.mean
+            delta = value - old_value
+            self.mean += delta / self.size
+            self.m2 += delta * (value - self.mean + old_value - old_mean)
+
+        self.values[self.position] = value
+        self.position = (self.position + 1) % self.size
+
+        self.updates += 1
+        if self.updates >= self.size * 64:
+            self.updates = 0
+            self.recompute()
+
+    def recompute(self):
+        window = self.window()
+        if not window:
+            self.mean = 0.0
+            self.m2 = 0.0
+            return
+        self.mean = calculate_mean(window)
+        self.m2 = sum((x - self.mean) ** 2 for x in window)
+
+    def window(self):
+        """Values currently in the window, oldest first"""
+        if self.count < self.size:
+            return self.values[: self.count]
+        return self.values[self.position:] + self.values[: self.position]
+
+    def standard_deviation(self):
+        if self.count == 0:
+            return 0.0
+        # Rounding can leave a tiny negative m2 when all values are equal
+        return (max(self.m2, 0.0) / self.count) ** 0.5
@@ -0,0 +1,14 @@
+import sys
+from common import convert_legacy_blockchain
+
+
+if __name__ == "__main__":
+    source_path = sys.argv[1] if len(sys.argv) > 1 else None
+    target_path = sys.argv[2] if len(sys.argv) > 2 else None
+
+    print("BLOCKCHAIN CONVERSION")
+    print("=" * 40)
+
+    total_blocks = convert_legacy_blockchain(source_path, target_path)
+
+    print(f"✅ {total_blocks} blocks converted to the append-only format")
@@ -1,9 +1,19 @@
-from common import generate_random_number, get_current_timestamp
+import itertools
+import time
+from common import generate_random_number, now_ns
 
+# Monotonic sequence id of the raw blocks, the verifier joins the analyzer results on it
+sequence = itertools.count()
 
-def generate_raw_data_block():
+
+def generate_raw_data_block(patient_id=0):
     return {
-        "timestamp": get_current_timestamp(),
+        "seq": next(sequence),
+        # Monotonic clock shared by all processes, start of the end to end latency
+        "generated_ns": time.monotonic_ns(),
+        "patient_id": patient_id,
+        # Wall clock, formatted only when the verifier persists the reading
+        "timestamp_ns": now_ns(),
         "frequency": generate_random_number(60, 180),
         "pressure": [generate_random_number(110, 180), generate_random_number(70, 110)],
         "oxygen": generate_random_number(90, 100),
@@ -1,59 +1,306 @@
+import argparse
 import time
-from multiprocessing import Pipe, Process, Queue
+from multiprocessing import Pipe, Process, Queue, Semaphore
 from generator import generate_raw_data_block
 from analyzers import frequency_process, pressure_process, oxygen_process
 from verifier import verifier_process
-from common import clear_blockchain
+from common import (
+    clear_blockchain,
+    get_data_path,
+    get_shard,
+    run_stage,
+    StageTracer,
+    LoadSchedule,
+    add_durability_arguments,
+    add_load_arguments,
+    get_durability_options,
+    get_load_options,
+    SEGMENT_SIZE,
+)
+from common.ring_buffer import BroadcastRing
 
+ANALYZER_TARGETS = (
+    ("frequency", frequency_process),
+    ("pressure", pressure_process),
+    ("oxygen", oxygen_process),
+)
 
-if __name__ == "__main__":
-    # Limpiar blockchain al inicio
-    clear_blockchain()
+# Results waiting for the verifier, the analyzers wait when it falls this far behind
+VERIFY_QUEUE_SIZE = 1024
 
-    # Pipes
-    freq_pipe_input, freq_pipe_output = Pipe()
-    pressure_pipe_input, pressure_pipe_output = Pipe()
-    oxygen_pipe_input, oxygen_pipe_output = Pipe()
 
-    # Queue
-    verify_queue = Queue()
+def start_process(stage, target, args, kwargs=None, stats_queue=None):
+    # Con stats_queue cada proceso informa su uso de CPU y memoria al terminar
+    if stats_queue is not None:
+        args = (stage, stats_queue, target, *args)
+        target = run_stage
+    process = Process(target=target, args=args, kwargs=kwargs or {})
+    process.start()
+    return process
 
-    # Procesos analizadores
-    freq_proc = Process(target=frequency_process, args=(freq_pipe_output, verify_queue))
-    freq_proc.start()
 
-    pressure_proc = Process(
-        target=pressure_process, args=(pressure_pipe_output, verify_queue)
-    )
-    pressure_proc.start()
+def start_shard(
+    verify_queue,
+    transport="pipe",
+    ring_slots=1024,
+    batch_size=1,
+    linger_ms=0.0,
+    stats_queue=None,
+    trace=False,
+    shard=0,
+    snapshot_interval=0.0,
+):
+    # Un shard son los tres analizadores de un grupo de pacientes
+    processes = []
 
-    oxygen_proc = Process(
-        target=oxygen_process, args=(oxygen_pipe_output, verify_queue)
-    )
-    oxygen_proc.start()
+    def start_analyzer(stage, target, pipe):
+        # Con snapshot_interval cada analizador guarda sus ventanas y las recupera al reiniciar
+        snapshot_path = None
+        if snapshot_interval:
+            snapshot_path = get_data_path(f"analyzer-{stage}-{shard}.snap")
+        args = (pipe, verify_queue, batch_size, linger_ms, trace, snapshot_path, snapshot_interval)
+        processes.append(start_process(stage, target, args, stats_queue=stats_queue))
+
+    if transport == "ring":
+        # Un solo buffer compartido, cada analizador lee todos los bloques con su propio cursor
+        ring = BroadcastRing(len(ANALYZER_TARGETS), ring_slots)
+        for index, (stage, target) in enumerate(ANALYZER_TARGETS):
+            start_analyzer(stage, target, ring.reader(index))
+        return [ring], processes
+
+    pipes = []
+    for stage, target in ANALYZER_TARGETS:
+        pipe_input, pipe_output = Pipe()
+        start_analyzer(stage, target, pipe_output)
+        pipes.append(pipe_input)
+    return pipes, processes
+
+
+def send_block(patient_pipes, patient_id, tracer):
+    data_block = generate_raw_data_block(patient_id)
+    for pipe in patient_pipes[patient_id]:
+        pipe.send(data_block)
+    # Tiempo bloqueado enviando, crece cuando los analizadores no dan abasto
+    tracer.record("send", time.monotonic_ns() - data_block["generated_ns"])
+
+
+def run_load_generator(
+    patient_pipes, rate=0.0, blocks=None, duration=None, credits=None, tracer=None
+):
+    """Send raw blocks round-robin over the patients until blocks or duration is reached.
+
+    The schedule is a LoadSchedule. Closed loop: a credit is taken per block
+    and the verifier gives it back when the block leaves its buffer, so at
+    most `window` blocks are in flight.
+    """
+    tracer = tracer or StageTracer("generator")
+    patients = len(patient_pipes)
+    schedule = LoadSchedule(rate, blocks, duration)
+
+    while schedule.running():
+        if credits is not None:
+            credits.acquire()
+        delay = schedule.delay()
+        if delay:
+            time.sleep(delay)
+
+        send_block(patient_pipes, schedule.sent % patients, tracer)
+        schedule.sent += 1
+
+    return schedule.finish()
+
+
+def run_pipeline(
+    patients=1,
+    shards=1,
+    samples=60,
+    transport="pipe",
+    ring_slots=1024,
+    batch_size=1,
+    linger_ms=0.0,
+    merkle_batch=0,
+    rate=None,
+    blocks=None,
+    duration=None,
+    pacing="open",
+    window=1000,
+    verbose=True,
+    stats_queue=None,
+    trace=False,
+    durability="none",
+    sync_every=100,
+    sync_interval_ms=10.0,
+    write_queue_size=1024,
+    segment_size=SEGMENT_SIZE,
+    snapshot_interval=0.0,
+    resume=False,
+):
+    # Limpiar blockchain al inicio, salvo que se continúe la cadena existente
+    if not resume:
+        clear_blockchain()
+
+    # Cola acotada: si el verificador se atrasa los analizadores esperan en vez de
+    # separarse entre sí, y el generador espera a los analizadores
+    verify_queue = Queue(max(VERIFY_QUEUE_SIZE // batch_size, 1))
+
+    # Latencias por etapa, SIGUSR1 las imprime en cada proceso
+    tracer = StageTracer("generator")
+    tracer.install_signal()
+
+    # Procesos analizadores, los pacientes se reparten entre los shards
+    shard_pipes = []
+    analyzer_procs = []
+    for shard in range(shards):
+        pipes, processes = start_shard(
+            verify_queue,
+            transport,
+            ring_slots,
+            batch_size,
+            linger_ms,
+            stats_queue,
+            trace,
+            shard,
+            snapshot_interval,
+        )
+        shard_pipes.append(pipes)
+        analyzer_procs.extend(processes)
+
+    patient_pipes = [shard_pipes[get_shard(patient_id, shards)] for patient_id in range(patients)]
+
+    # Modo carga: sin el sleep(1) fijo, con ritmo y cantidad configurables
+    load_mode = rate is not None or blocks is not None or duration is not None
+    credits = Semaphore(window) if load_mode and pacing == "closed" else None
 
     # Proceso verificador
-    data_block_verifier_proc = Process(target=verifier_process, args=(verify_queue,))
-    data_block_verifier_proc.start()
+    data_block_verifier_proc = start_process(
+        "verifier",
+        verifier_process,
+        (verify_queue,),
+        {
+            "merkle_batch": merkle_batch,
+            "credits": credits,
+            "verbose": verbose,
+            "trace": trace,
+            "durability": durability,
+            "sync_every": sync_every,
+            "sync_interval_ms": sync_interval_ms,
+            "write_queue_size": write_queue_size,
+            "segment_size": segment_size,
+            "resume": resume,
+        },
+        stats_queue,
+    )
 
     # Generador de bloques de datos
-    for i in range(60):
-        data_block = generate_raw_data_block()
-
-        freq_pipe_input.send(data_block)
-        pressure_pipe_input.send(data_block)
-        oxygen_pipe_input.send(data_block)
+    start = time.monotonic()
+    max_lag = 0.0
+    if load_mode:
+        sent, max_lag = run_load_generator(
+            patient_pipes, rate or 0.0, blocks, duration, credits, tracer
+        )
+    else:
+        sent = samples * patients
+        for i in range(samples):
+            for patient_id in range(patients):
+                send_block(patient_pipes, patient_id, tracer)
 
-        time.sleep(1)
+            time.sleep(1)
 
     # Terminar procesos
-    freq_pipe_input.send(None)
-    pressure_pipe_input.send(None)
-    oxygen_pipe_input.send(None)
-    verify_queue.put(None)
+    for pipes in shard_pipes:
+        for pipe in pipes:
+            pipe.send(None)
 
-    # Esperar a que terminen
-    freq_proc.join()
-    pressure_proc.join()
-    oxygen_proc.join()
+    # Esperar a que terminen, el verificador recibe None despues del ultimo resultado
+    for process in analyzer_procs:
+        process.join()
+    verify_queue.put(None)
     data_block_verifier_proc.join()
+    elapsed = time.monotonic() - start
+
+    if transport == "ring":
+        for pipes in shard_pipes:
+            for ring in pipes:
+                ring.close()
+
+    if trace:
+        tracer.dump()
+
+    return {
+        "sent": sent,
+        "elapsed_s": elapsed,
+        "max_lag_s": max_lag,
+        "tracer": tracer,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Biometric analysis pipeline")
+    parser.add_argument("--patients", type=int, default=1, help="number of monitored patients")
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="analyzer groups, each one runs the three analyzers for its patients",
+    )
+    parser.add_argument(
+        "--transport",
+        choices=["pipe", "ring"],
+        default="pipe",
+        help="generator to analyzers transport: one Pipe per analyzer or a shared memory ring",
+    )
+    parser.add_argument(
+        "--ring-slots",
+        type=int,
+        default=1024,
+        help="slots of the shared memory ring, the generator waits when the slowest analyzer is this far behind",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=1,
+        help="results per message from the analyzers to the verifier (1 disables batching)",
+    )
+    parser.add_argument(
+        "--linger-ms",
+        type=float,
+        default=0.0,
+        help="maximum time a result waits in an incomplete batch",
+    )
+    parser.add_argument(
+        "--merkle-batch",
+        type=int,
+        default=0,
+        help="chain N readings per block under a Merkle root (0 chains one block per reading)",
+    )
+    add_durability_arguments(parser)
+    parser.add_argument(
+        "--snapshot-interval",
+        type=float,
+        default=0.0,
+        help="seconds between snapshots of the analyzer windows, restored when the analyzers "
+        "start again (0 disables)",
+    )
+    add_load_arguments(parser)
+    parser.add_argument("--quiet", action="store_true", help="do not print every block")
+    parser.add_argument(
+        "--trace",
+        action="store_true",
+        help="print the per-stage latency histograms of every process at shutdown (also on SIGUSR1)",
+    )
+    args = parser.parse_args()
+
+    run_pipeline(
+        patients=args.patients,
+        shards=args.shards,
+        transport=args.transport,
+        ring_slots=args.ring_slots,
+        batch_size=args.batch_size,
+        linger_ms=args.linger_ms,
+        merkle_batch=args.merkle_batch,
+        verbose=not args.quiet,
+        trace=args.trace,
+        snapshot_interval=args.snapshot_interval,
+        **get_load_options(args),
+        **get_durability_options(args),
+    )
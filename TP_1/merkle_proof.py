@@ -0,0 +1,99 @@
+import argparse
+import json
+import sys
+from common import get_block, calculate_block_hash
+from common.encryption import MERKLE_HASH_VERSION
+from common.merkle import merkle_proof, verify_merkle_proof
+
+
+def create_inclusion_proof(block_index, reading_index):
+    """Proof that one reading is part of a Merkle block of the chain"""
+    try:
+        block = get_block(block_index)
+    except IndexError:
+        raise ValueError(f"block #{block_index} does not exist")
+    if block.get("version") != MERKLE_HASH_VERSION:
+        raise ValueError(f"block #{block_index} is not a Merkle batch block")
+
+    readings = block["data"]["readings"]
+    if not 0 <= reading_index < len(readings):
+        raise ValueError(f"block #{block_index} has no reading #{reading_index}")
+
+    return {
+        "block_index": block_index,
+        "reading_index": reading_index,
+        "reading": readings[reading_index],
+        "proof": merkle_proof(readings, reading_index),
+        "merkle_root": block["data"]["merkle_root"],
+        "timestamp": block["timestamp"],
+        "prev_hash": block["prev_hash"],
+        "block_hash": block["hash"],
+    }
+
+
+def get_chain_hash(block_index):
+    try:
+        return get_block(block_index)["hash"]
+    except IndexError:
+        return None
+
+
+def check_inclusion_proof(proof, trusted_hash=None):
+    """Check the reading against the Merkle root, the root against the block hash
+    and the block hash against a trusted one.
+
+    The trusted hash is the hash of block #block_index in the local chain
+    unless one is given, e.g. a hash published by whoever holds the chain.
+    Everything else in the proof comes from its author and proves nothing alone.
+    """
+    if trusted_hash is None:
+        trusted_hash = get_chain_hash(proof["block_index"])
+    if trusted_hash is None or proof["block_hash"] != trusted_hash:
+        return False
+    if not verify_merkle_proof(proof["reading"], proof["proof"], proof["merkle_root"]):
+        return False
+    block_hash = calculate_block_hash(
+        proof["prev_hash"],
+        {"merkle_root": proof["merkle_root"]},
+        proof["timestamp"],
+        MERKLE_HASH_VERSION,
+    )
+    return block_hash == proof["block_hash"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merkle inclusion proofs for single readings")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    prove_parser = subparsers.add_parser("prove", help="print the proof of one reading as JSON")
+    prove_parser.add_argument("block_index", type=int)
+    prove_parser.add_argument("reading_index", type=int)
+
+    check_parser = subparsers.add_parser("check", help="check a proof read from a file or stdin")
+    check_parser.add_argument("proof_file", nargs="?", default="-")
+    check_parser.add_argument(
+        "--block-hash",
+        help="trusted hash of the block, instead of the one in the local chain",
+    )
+
+    args = parser.parse_args()
+
+    if args.command == "prove":
+        try:
+            proof = create_inclusion_proof(args.block_index, args.reading_index)
+        except ValueError as error:
+            print(f"❌ {error}", file=sys.stderr)
+            sys.exit(1)
+        print(json.dumps(proof, indent=2))
+    else:
+        if args.proof_file == "-":
+            proof = json.load(sys.stdin)
+        else:
+            with open(args.proof_file, "r") as f:
+                proof = json.load(f)
+
+        if check_inclusion_proof(proof, args.block_hash):
+            print(f"✅ Reading #{proof['reading_index']} is included in block #{proof['block_index']}")
+        else:
+            print("❌ Invalid inclusion proof")
+            sys.exit(1)
@@ -0,0 +1,158 @@
+import argparse
+import json
+import time
+from common import (
+    get_block,
+    iter_blocks,
+    iter_block_readings,
+    get_signal_values,
+    parse_timestamp,
+    find_first_block_at,
+    ALERT_CAUSES,
+    count_alerts,
+    iter_alerts,
+    format_timestamp,
+    load_rollups,
+    summarize_rollups,
+    describe_bucket,
+    ROLLUP_RESOLUTIONS,
+)
+from verifier import read_rollups
+from verifier.process import PENDING_TIMEOUT
+
+SIGNALS = ["frequency", "systolic", "diastolic", "oxygen"]
+
+# The verifier writes blocks in completion order, so a block can be older than the
+# one before it by up to its reorder timeout; the scan goes that far past the range
+TIME_SKEW = PENDING_TIMEOUT
+
+
+def query_readings(start=None, end=None, alert=None, above=(), below=()):
+    """Yield (block index, reading) for the readings in [start, end] that pass the filters.
+
+    start and end are epoch seconds (None for an open end). above and below
+    are (signal, value) pairs the reading mean must be strictly above/below.
+    """
+    start = float("-inf") if start is None else start
+    end = float("inf") if end is None else end
+
+    first_block = find_first_block_at(start)
+    for block_index, block in enumerate(iter_blocks(first_block), first_block):
+        if parse_timestamp(block["timestamp"]) > end + TIME_SKEW:
+            break
+
+        for reading in iter_block_readings(block):
+            reading_time = parse_timestamp(reading["timestamp"])
+            if reading_time < start or reading_time > end:
+                continue
+            if alert is not None and reading["alert"] != alert:
+                continue
+            if above or below:
+                values = get_signal_values(reading)
+                if any(values[signal] <= value for signal, value in above):
+                    continue
+                if any(values[signal] >= value for signal, value in below):
+                    continue
+            yield block_index, reading
+
+
+def iter_rollups(resolution, start=None, end=None):
+    """(bucket start, {signal: stats}) of the buckets that start in [start, end], in time order"""
+    content, pending = read_rollups()
+    buckets = {}
+    for (_, bucket_start, signal), bucket in load_rollups(resolution, pending=pending, content=content).items():
+        if start is not None and bucket_start + ROLLUP_RESOLUTIONS[resolution] <= start:
+            continue
+        if end is not None and bucket_start > end:
+            continue
+        buckets.setdefault(bucket_start, {})[signal] = describe_bucket(bucket)
+    for bucket_start in sorted(buckets):
+        yield bucket_start, buckets[bucket_start]
+
+
+def parse_threshold(signal, value):
+    if signal not in SIGNALS:
+        raise argparse.ArgumentTypeError(f"unknown signal {signal}, use one of {', '.join(SIGNALS)}")
+    return signal, float(value)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the blockchain readings by time range")
+    parser.add_argument("--from", dest="start", help="start timestamp, e.g. 2025-01-01T02:00:00")
+    parser.add_argument("--to", dest="end", help="end timestamp (inclusive)")
+    parser.add_argument("--last", type=float, help="only the last N minutes, overrides --from/--to")
+    parser.add_argument("--alert", action="store_true", help="only readings with an alert")
+    parser.add_argument(
+        "--above",
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("SIGNAL", "VALUE"),
+        help=f"mean of SIGNAL above VALUE ({', '.join(SIGNALS)})",
+    )
+    parser.add_argument(
+        "--below",
+        nargs=2,
+        action="append",
+        default=[],
+        metavar=("SIGNAL", "VALUE"),
+        help="mean of SIGNAL below VALUE",
+    )
+    parser.add_argument(
+        "--alert-cause",
+        choices=ALERT_CAUSES,
+        help="list the blocks with this alert cause from the alert index (ignores the other filters)",
+    )
+    parser.add_argument(
+        "--rollup",
+        choices=ROLLUP_RESOLUTIONS,
+        help="per bucket count, mean, std dev, min, max and alerts of every signal from the rollups "
+        "(ignores the reading filters)",
+    )
+    parser.add_argument(
+        "--average",
+        action="store_true",
+        help="aggregate of every signal over the range from the rollups, edges rounded to whole minutes",
+    )
+    parser.add_argument("--count", action="store_true", help="only print the number of results")
+    args = parser.parse_args()
+
+    try:
+        above = [parse_threshold(*threshold) for threshold in args.above]
+        below = [parse_threshold(*threshold) for threshold in args.below]
+    except argparse.ArgumentTypeError as error:
+        parser.error(str(error))
+
+    if args.alert_cause:
+        # Answered from the alert index, the chain is only read for the listed blocks
+        if args.count:
+            print(count_alerts(args.alert_cause))
+        else:
+            for block_index in iter_alerts(args.alert_cause):
+                print(json.dumps({"block_index": block_index, **get_block(block_index)}))
+        raise SystemExit
+
+    if args.last is not None:
+        end = time.time()
+        start = end - args.last * 60
+    else:
+        start = parse_timestamp(args.start) if args.start else None
+        end = parse_timestamp(args.end) if args.end else None
+
+    if args.rollup:
+        for bucket_start, signals in iter_rollups(args.rollup, start, end):
+            print(json.dumps({"start": format_timestamp(int(bucket_start * 1e9)), **signals}))
+        raise SystemExit
+    if args.average:
+        content, pending = read_rollups()
+        totals = summarize_rollups(start, end, pending=pending, content=content)
+        print(json.dumps({signal: describe_bucket(bucket) for signal, bucket in totals.items()}))
+        raise SystemExit
+
+    results = query_readings(start, end, alert=True if args.alert else None, above=above, below=below)
+
+    if args.count:
+        print(sum(1 for _ in results))
+    else:
+        for block_index, reading in results:
+            print(json.dumps({"block_index": block_index, **reading}))
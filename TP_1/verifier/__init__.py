@@ -1,4 +1,26 @@
-from .main import data_block_verifier
-from .process import verifier_process
+from .main import (
+    data_block_verifier,
+    merkle_block_verifier,
+    get_alert_causes,
+    get_block_alert_causes,
+    restore_previous_hash,
+    add_block_rollups,
+    update_rollups,
+    update_alerts,
+    read_rollups,
+)
+from .process import Verifier, verifier_process
 
-__all__ = ["data_block_verifier", "verifier_process"]
+__all__ = [
+    "data_block_verifier",
+    "merkle_block_verifier",
+    "get_alert_causes",
+    "get_block_alert_causes",
+    "restore_previous_hash",
+    "add_block_rollups",
+    "update_rollups",
+    "update_alerts",
+    "read_rollups",
+    "Verifier",
+    "verifier_process",
+]
@@ -1,13 +1,110 @@
-from common import calculate_block_hash
+from common import (
+    calculate_block_hash,
+    iter_blocks,
+    iter_block_readings,
+    get_signal_values,
+    parse_timestamp,
+    format_timestamp,
+    count_blocks,
+    read_committed,
+    RollupBuckets,
+    append_alert,
+    get_last_alert,
+    ALERT_CAUSES,
+    HASH_VERSION,
+)
+from common.encryption import MERKLE_HASH_VERSION
+from common.merkle import merkle_root
 
 previous_hash = "0"
 
+FREQUENCY_LIMIT = 200
+SYSTOLIC_LIMIT = 200
+OXYGEN_RANGE = (90, 100)
 
-def data_block_verifier(complete_data):
+
+def restore_previous_hash(block_hash):
+    # Resuming an existing chain: the next block links to its last one
     global previous_hash
+    previous_hash = block_hash
+
+
+def get_alert_causes(frequency_mean, systolic_mean, oxygen_mean):
+    causes = []
+    if frequency_mean >= FREQUENCY_LIMIT:
+        causes.append("frequency")
+    if oxygen_mean < OXYGEN_RANGE[0] or oxygen_mean > OXYGEN_RANGE[1]:
+        causes.append("oxygen")
+    if systolic_mean >= SYSTOLIC_LIMIT:
+        causes.append("systolic")
+    return causes
+
+
+def get_block_alert_causes(block):
+    """Alert causes raised by any reading of a block, in ALERT_CAUSES order"""
+    if not block["alert"]:
+        return []
+    causes = set()
+    for reading in iter_block_readings(block):
+        values = get_signal_values(reading)
+        causes.update(get_alert_causes(values["frequency"], values["systolic"], values["oxygen"]))
+    return [cause for cause in ALERT_CAUSES if cause in causes]
+
+
+def add_block_rollups(rollups, index, block):
+    """Aggregate the readings of block #index, with their alert causes, into the rollups"""
+    readings = []
+    for reading in iter_block_readings(block):
+        values = get_signal_values(reading)
+        causes = get_alert_causes(values["frequency"], values["systolic"], values["oxygen"])
+        readings.append((parse_timestamp(reading["timestamp"]), values, causes))
+    rollups.add_block(index, parse_timestamp(block["timestamp"]), readings, block.get("alert", False))
+
+
+def update_rollups(rollups, block_count):
+    """Replay the chain blocks the rollups do not cover yet, up to block_count"""
+    for index, block in enumerate(iter_blocks(rollups.blocks, block_count), rollups.blocks):
+        add_block_rollups(rollups, index, block)
+
+
+def update_alerts(block_count, start=0):
+    """Index the alerts of the chain blocks after the last indexed one, up to block_count.
+
+    The chain is appended before the alert index, so a crash leaves at most
+    the causes of its last blocks missing. The scan starts at the last
+    indexed alert, or at start when the caller knows the blocks before it
+    are indexed, and each cause only gets the blocks after its own last one.
+    """
+    last_alerts = {cause: get_last_alert(cause) for cause in ALERT_CAUSES}
+    start = max([start, *(index for index in last_alerts.values() if index is not None)])
+    for index, block in enumerate(iter_blocks(start, block_count), start):
+        causes = [
+            cause
+            for cause in get_block_alert_causes(block)
+            if last_alerts[cause] is None or last_alerts[cause] < index
+        ]
+        if causes:
+            append_alert(index, causes)
 
-    timestamp = complete_data["frequency"]["timestamp"]
 
+def read_rollups():
+    """Committed rollups and the chain blocks they do not cover yet, without writing anything.
+
+    Returns the committed records and a RollupBuckets with the missing blocks,
+    for load_rollups and summarize_rollups. Rollups that claim more blocks
+    than the chain has belong to another chain and are ignored.
+    """
+    content, rollup_blocks = read_committed()
+    block_count = count_blocks()
+    if rollup_blocks > block_count:
+        content, rollup_blocks = b"", 0
+    pending = RollupBuckets(rollup_blocks)
+    update_rollups(pending, block_count)
+    return content, pending
+
+
+def build_reading(complete_data):
+    """Block data and alert flag of one set of frequency, pressure and oxygen results"""
     # Data
     frequency_data = {
         "mean": complete_data["frequency"]["mean"],
@@ -23,23 +120,31 @@ def data_block_verifier(complete_data):
     }
 
     data = {
+        "patient_id": complete_data["frequency"]["patient_id"],
         "frequency": frequency_data,
         "pressure": pressure_data,
         "oxygen": oxygen_data,
     }
 
     # Alert
-    alert = False
-    if complete_data["frequency"]["mean"] >= 200:
-        alert = True
-    if complete_data["oxygen"]["mean"] < 90 or complete_data["oxygen"]["mean"] > 100:
-        alert = True
-    if complete_data["pressure"]["mean"][0] >= 200:  # Systolic pressure
-        alert = True
+    alert = bool(
+        get_alert_causes(
+            complete_data["frequency"]["mean"],
+            complete_data["pressure"]["mean"][0],  # Systolic pressure
+            complete_data["oxygen"]["mean"],
+        )
+    )
+
+    return data, alert
+
+
+def chain_block(data, alert, timestamp, version):
+    global previous_hash
 
-    current_hash = calculate_block_hash(previous_hash, data, timestamp)
+    current_hash = calculate_block_hash(previous_hash, data, timestamp, version)
 
     block = {
+        "version": version,
         "timestamp": timestamp,
         "data": data,
         "alert": alert,
@@ -51,3 +156,22 @@ def data_block_verifier(complete_data):
     previous_hash = current_hash
 
     return block
+
+
+def data_block_verifier(complete_data):
+    timestamp = format_timestamp(complete_data["frequency"]["timestamp_ns"])
+    data, alert = build_reading(complete_data)
+    return chain_block(data, alert, timestamp, HASH_VERSION)
+
+
+def merkle_block_verifier(complete_data_list):
+    """Chain a batch of readings as one block that stores their Merkle root"""
+    readings = []
+    for complete_data in complete_data_list:
+        data, alert = build_reading(complete_data)
+        timestamp = format_timestamp(complete_data["frequency"]["timestamp_ns"])
+        readings.append({"timestamp": timestamp, **data, "alert": alert})
+
+    data = {"merkle_root": merkle_root(readings), "readings": readings}
+    alert = any(reading["alert"] for reading in readings)
+    return chain_block(data, alert, readings[-1]["timestamp"], MERKLE_HASH_VERSION)
@@ -1,38 +1,380 @@
+import queue as queue_module
+import threading
+import time
+from collections import OrderedDict
 from multiprocessing import Queue
-from verifier import data_block_verifier
-from common import add_block_to_chain
+from verifier import (
+    data_block_verifier,
+    merkle_block_verifier,
+    get_block_alert_causes,
+    restore_previous_hash,
+    add_block_rollups,
+    update_rollups,
+    update_alerts,
+)
+from common import (
+    ChainWriter,
+    append_alert,
+    count_blocks,
+    recover_blockchain,
+    trim_alerts,
+    trim_rollups,
+    RollupWriter,
+    StageTracer,
+    SEGMENT_SIZE,
+)
 
+REQUIRED_TYPES = {"frequency", "pressure", "oxygen"}
 
-def verifier_process(queue: Queue):
-    pending_blocks = {}
-    blockchain = []
+# The runners bound the queue into the verifier, so an analyzer is never this many
+# seqs behind another one: the buffer only overflows when results were lost
+MAX_PENDING = 10_000
+PENDING_TIMEOUT = 5.0
 
+# Chained blocks waiting for the writer thread
+WRITE_QUEUE_SIZE = 1024
+
+
+def mark_evicted(evicted_seqs, seq, max_pending):
+    # Remember the last evicted ids so their late results are dropped instead of reopened
+    evicted_seqs[seq] = None
+    if len(evicted_seqs) > max_pending:
+        evicted_seqs.popitem(last=False)
+
+
+def evict_expired(pending_blocks, evicted_seqs, counters, pending_timeout, max_pending, credits):
+    # Entries are kept in order of their first result, so expired ones are at the front
+    deadline = time.monotonic_ns() - int(pending_timeout * 1e9)
+    while pending_blocks:
+        seq, entry = next(iter(pending_blocks.items()))
+        if entry["first_seen_ns"] > deadline:
+            break
+        del pending_blocks[seq]
+        mark_evicted(evicted_seqs, seq, max_pending)
+        counters["evicted_timeout"] += 1
+        release_credit(credits)
+
+
+def release_credit(credits):
+    # Closed-loop load generation: every raw block that leaves the buffer frees a slot
+    if credits is not None:
+        credits.release()
+
+
+def build_block(readings, merkle_batch, tracer):
+    start_ns = time.monotonic_ns()
+    if merkle_batch > 1:
+        block = merkle_block_verifier(readings)
+    else:
+        block = data_block_verifier(readings[0])
+    tracer.record("hash", time.monotonic_ns() - start_ns)
+    return block
+
+
+def hand_off_block(write_queue, write_stats, block, index, readings, tracer):
+    """Queue a chained block for the writer thread, blocking only while the queue is full"""
+    # The writer records end_to_end from the raw generation once the block is committed
+    started_ns = [complete_data["frequency"]["generated_ns"] for complete_data in readings]
+    item = (block, index, started_ns)
+    try:
+        write_queue.put_nowait(item)
+    except queue_module.Full:
+        start_ns = time.monotonic_ns()
+        write_queue.put(item)
+        stall_ns = time.monotonic_ns() - start_ns
+        write_stats["stalls"] += 1
+        write_stats["stall_ns"] += stall_ns
+        tracer.record("stall", stall_ns)
+
+    depth = write_queue.qsize()
+    write_stats["handoffs"] += 1
+    write_stats["depth_total"] += depth
+    write_stats["max_depth"] = max(write_stats["max_depth"], depth)
+
+
+def run_writer(writer, write_queue, tracer, errors, verbose=True, rollups=None):
+    """Writer thread: append the queued blocks until the None sentinel, then close the chain"""
     while True:
-        data = queue.get()
-        if data is None:
+        # Wake up in time for an interval commit even if no more blocks arrive
+        sync_deadline = writer.sync_deadline()
+        timeout = None if sync_deadline is None else max(sync_deadline - time.monotonic(), 0.0)
+        try:
+            item = write_queue.get(timeout=timeout)
+        except queue_module.Empty:
+            writer.poll()
+            continue
+        if item is None:
             break
+        if errors:
+            # After a failed write keep draining so the main loop never blocks on a full queue
+            continue
+
+        block, index, started_ns = item
+        start_ns = time.monotonic_ns()
+        try:
+            store_block(writer, block, index, started_ns, verbose, rollups)
+        except Exception as error:
+            errors.append(error)
+            continue
+        tracer.record("persist", time.monotonic_ns() - start_ns)
+
+    writer.close()
+    if rollups is not None:
+        rollups.close()
+
+
+def store_block(writer, block, index, started_ns=(), verbose=True, rollups=None):
+    writer.append(block, started_ns)
+
+    # Alert index by cause, kept up to date as the chain grows
+    causes = get_block_alert_causes(block)
+    if causes:
+        append_alert(index, causes)
+
+    # Minute, hour and day rollups for the reports
+    if rollups is not None:
+        add_block_rollups(rollups, index, block)
+
+    # Info
+    if verbose:
+        alert_text = "⚠️ ALERT" if block["alert"] else "✓ OK"
+        print(f"\033[93mBlock #{index} - Hash: {block['hash'][:16]}... - {alert_text}\033[0m")
+
 
-        timestamp = data["timestamp"]
-        block_type = data["type"]
+def resume_chain():
+    """Continue the chain on disk, returns the index of the next block and the rollups"""
+    start_ns = time.monotonic_ns()
+    last_block = recover_blockchain()
+    restore_previous_hash(last_block["hash"] if last_block else "0")
+    block_count = count_blocks()
+    trim_alerts(block_count)
+    rollup_blocks = trim_rollups(block_count)
+    # Blocks covered by the rollups had their alerts indexed first, the rest are caught up
+    update_alerts(block_count, rollup_blocks)
+    # The rollups lose at most their last minute, replayed from the chain
+    rollups = RollupWriter(rollup_blocks)
+    update_rollups(rollups, block_count)
+    elapsed_ms = (time.monotonic_ns() - start_ns) / 1e6
+    if last_block is None:
+        print(f"Verifier: nothing to resume, new chain ({elapsed_ms:.1f} ms)")
+    else:
+        print(
+            f"Verifier: resuming after block #{block_count - 1} "
+            f"(hash {last_block['hash'][:16]}...) in {elapsed_ms:.1f} ms"
+        )
+    return block_count, rollups
 
-        if timestamp not in pending_blocks:
-            pending_blocks[timestamp] = {}
 
-        pending_blocks[timestamp][block_type] = data
+class Verifier:
+    """Join the analyzer results by seq, chain them and append the blocks.
 
-        if len(pending_blocks[timestamp]) == 3:
-            required_types = {"frequency", "pressure", "oxygen"}
-            if set(pending_blocks[timestamp].keys()) == required_types:
-                complete_data = pending_blocks[timestamp]
+    Hashing and chaining run in the caller's loop. The chained blocks are
+    handed to a writer thread through a bounded queue, so a slow disk only
+    stops the caller once write_queue_size blocks are waiting. Blocks are
+    committed to disk according to the ChainWriter durability mode.
 
-                block = data_block_verifier(complete_data)
+    Per stage latencies (queue, join, hash, stall, persist and end_to_end)
+    are kept in a StageTracer. With resume the existing chain is continued
+    after its last valid block.
 
-                current_index = add_block_to_chain(blockchain, block)
+    The loop that feeds it is up to the runner: verifier_process reads a
+    multiprocessing Queue, the asyncio runner awaits an asyncio.Queue.
+    """
 
-                # Info
-                alert_text = "⚠️ ALERT" if block["alert"] else "✓ OK"
-                print(
-                    f"\033[93mBlock #{current_index} - Hash: {block['hash'][:16]}... - {alert_text}\033[0m"
-                )
+    def __init__(
+        self,
+        max_pending=MAX_PENDING,
+        pending_timeout=PENDING_TIMEOUT,
+        merkle_batch=0,
+        credits=None,
+        verbose=True,
+        durability="none",
+        sync_every=100,
+        sync_interval_ms=10.0,
+        write_queue_size=WRITE_QUEUE_SIZE,
+        segment_size=SEGMENT_SIZE,
+        resume=False,
+    ):
+        self.max_pending = max_pending
+        self.pending_timeout = pending_timeout
+        self.merkle_batch = merkle_batch
+        self.credits = credits
+        self.verbose = verbose
+        self.durability = durability
+
+        # Reorder buffer: seq -> results received so far for that raw block
+        self.pending_blocks = OrderedDict()
+        self.evicted_seqs = OrderedDict()
+        self.counters = {
+            "completed": 0,
+            "evicted_timeout": 0,
+            "evicted_overflow": 0,
+            "late": 0,
+            "incomplete_at_shutdown": 0,
+        }
+        # Readings waiting to be chained together under one Merkle root
+        self.merkle_readings = []
+        self.tracer = StageTracer("verifier")
+        # From the first result received, for the chained readings/s of the summary
+        self.first_result_ns = None
+
+        if resume:
+            self.block_count, self.rollups = resume_chain()
+        else:
+            self.block_count, self.rollups = 0, RollupWriter(0)
+        self.first_block = self.block_count
+        self.writer = ChainWriter(durability, sync_every, sync_interval_ms, self.tracer, segment_size)
+        self.write_queue = queue_module.Queue(write_queue_size)
+        self.write_stats = {
+            "handoffs": 0,
+            "depth_total": 0,
+            "max_depth": 0,
+            "stalls": 0,
+            "stall_ns": 0,
+        }
+        self.write_errors = []
+        self.writer_thread = threading.Thread(
+            target=run_writer,
+            args=(self.writer, self.write_queue, self.tracer, self.write_errors, verbose, self.rollups),
+            daemon=True,
+        )
+        self.writer_thread.start()
+
+    def expire(self):
+        evict_expired(
+            self.pending_blocks,
+            self.evicted_seqs,
+            self.counters,
+            self.pending_timeout,
+            self.max_pending,
+            self.credits,
+        )
+
+    def handle(self, message):
+        received_ns = time.monotonic_ns()
+        if self.first_result_ns is None:
+            self.first_result_ns = received_ns
+        pending_blocks = self.pending_blocks
+        counters = self.counters
+
+        # Analyzers in batching mode send a list of results
+        results = message if isinstance(message, list) else [message]
+        for data in results:
+            seq = data["seq"]
+            self.tracer.record("queue", received_ns - data["analyzed_ns"])
+            entry = pending_blocks.get(seq)
+
+            if entry is None:
+                if seq in self.evicted_seqs:
+                    counters["late"] += 1
+                    continue
+                entry = pending_blocks[seq] = {"first_seen_ns": received_ns, "results": {}}
+                if len(pending_blocks) > self.max_pending:
+                    evicted_seq, _ = pending_blocks.popitem(last=False)
+                    mark_evicted(self.evicted_seqs, evicted_seq, self.max_pending)
+                    counters["evicted_overflow"] += 1
+                    release_credit(self.credits)
+
+            entry["results"][data["type"]] = data
+
+            if len(entry["results"]) == 3 and set(entry["results"]) == REQUIRED_TYPES:
+                del pending_blocks[seq]
+                counters["completed"] += 1
+                release_credit(self.credits)
+                self.tracer.record("join", received_ns - entry["first_seen_ns"])
+
+                if self.merkle_batch > 1:
+                    self.merkle_readings.append(entry["results"])
+                    if len(self.merkle_readings) < self.merkle_batch:
+                        continue
+                    readings = self.merkle_readings
+                    self.merkle_readings = []
+                else:
+                    readings = [entry["results"]]
+
+                self.chain(readings)
+
+        self.expire()
+
+    def chain(self, readings):
+        # A failed write stops the chain here: the next block would link to one never written
+        if self.write_errors:
+            raise self.write_errors[0]
+        block = build_block(readings, self.merkle_batch, self.tracer)
+        hand_off_block(
+            self.write_queue, self.write_stats, block, self.block_count, readings, self.tracer
+        )
+        self.block_count += 1
+
+    def close(self):
+        """Chain the last Merkle batch, wait for the writer and print the summary"""
+        if self.merkle_readings:
+            self.chain(self.merkle_readings)
+            self.merkle_readings = []
+
+        # Every queued block is written and committed before the summary
+        self.write_queue.put(None)
+        self.writer_thread.join()
+        if self.write_errors:
+            raise self.write_errors[0]
+
+        counters = self.counters
+        write_stats = self.write_stats
+        blocks = self.block_count - self.first_block
+        counters["incomplete_at_shutdown"] = len(self.pending_blocks)
+        elapsed = (time.monotonic_ns() - self.first_result_ns) / 1e9 if self.first_result_ns else 0.0
+        print(
+            f"Verifier: {blocks} blocks with {counters['completed']} readings in {elapsed:.2f}s "
+            f"({counters['completed'] / elapsed if elapsed else 0:.0f} readings/s chained), "
+            f"{counters['evicted_timeout']} incomplete evicted by timeout, "
+            f"{counters['evicted_overflow']} evicted by overflow, "
+            f"{counters['late']} late results dropped, "
+            f"{counters['incomplete_at_shutdown']} incomplete at shutdown"
+            + (f", {self.writer.syncs} fsyncs" if self.durability != "none" else "")
+        )
+        lost = counters["evicted_timeout"] + counters["evicted_overflow"] + counters["incomplete_at_shutdown"]
+        if lost:
+            print(f"Verifier: WARNING {lost} readings were not chained, the pipeline dropped data")
+        write_stats["mean_depth"] = (
+            write_stats["depth_total"] / write_stats["handoffs"] if write_stats["handoffs"] else 0.0
+        )
+        print(
+            f"Writer: max queue depth {write_stats['max_depth']}/{self.write_queue.maxsize}, "
+            f"mean {write_stats['mean_depth']:.1f}, {write_stats['stalls']} stalls "
+            f"({write_stats['stall_ns'] / 1e9:.3f}s blocked on a full queue)"
+        )
+
+        return {
+            "blocks": blocks,
+            **counters,
+            "lost": lost,
+            "chained_s": elapsed,
+            "syncs": self.writer.syncs,
+            "writer": write_stats,
+            "tracer": self.tracer,
+        }
+
+
+def verifier_process(queue: Queue, pending_timeout=PENDING_TIMEOUT, trace=False, **options):
+    """Verifier process: feed a Verifier from the analyzers queue until the None sentinel.
+
+    options are the Verifier arguments. The stage tracer is printed on
+    SIGUSR1 and, with trace, at shutdown.
+    """
+    verifier = Verifier(pending_timeout=pending_timeout, **options)
+    verifier.tracer.install_signal()
+
+    while True:
+        try:
+            message = queue.get(timeout=pending_timeout)
+        except queue_module.Empty:
+            verifier.expire()
+            continue
+        if message is None:
+            break
+        verifier.handle(message)
 
-                del pending_blocks[timestamp]
+    result = verifier.close()
+    if trace:
+        verifier.tracer.dump()
+    return result
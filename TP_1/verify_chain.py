@@ -1,54 +1,384 @@
+import argparse
+import hashlib
+import json
 import os
-from common import load_blockchain, calculate_block_hash
+from multiprocessing import Pool
+from common import (
+    iter_blockchain_records,
+    count_blocks,
+    calculate_block_hash,
+    get_data_path,
+    get_chain_size,
+    get_segment_path,
+    iter_segment_files,
+    read_chain_bytes,
+    load_segments,
+    format_timestamp,
+    summarize_rollups,
+    load_rollups,
+    describe_bucket,
+)
+from common.encryption import MERKLE_HASH_VERSION
+from common.merkle import merkle_root
+from verifier import read_rollups
+
+CHECKPOINT_FILE = "verify_checkpoint.json"
 
 
 def recalculate_hash(block, previous_hash):
     """Recalculate hash for a block using common encryption function"""
-    return calculate_block_hash(previous_hash, block["data"], block["timestamp"])
+    # Blocks written before the version field existed use the legacy str(data) hash
+    return calculate_block_hash(
+        previous_hash, block["data"], block["timestamp"], block.get("version", 1)
+    )
 
 
-def verify_blockchain_integrity():
-    blockchain = load_blockchain()
+def load_checkpoint():
+    checkpoint_path = get_data_path(CHECKPOINT_FILE)
+    if not os.path.exists(checkpoint_path):
+        return None
+    try:
+        with open(checkpoint_path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
 
-    if blockchain is None:
-        return False
 
-    if len(blockchain) == 0:
-        print("✅ Blockchain is empty - no corruption possible")
-        return True
+def get_file_start(offset):
+    """Chain offset where the segment or active file holding the byte before offset starts"""
+    for _, segment_start in iter_segment_files(max(offset - 1, 0)):
+        return segment_start
+    return 0
+
+
+def hash_chain_range(start, stop, digest=None):
+    """Feed the chain bytes [start, stop) across the segments into a SHA-256 digest"""
+    digest = digest or hashlib.sha256()
+    for path, segment_start in iter_segment_files(start):
+        if segment_start >= stop:
+            break
+        with open(path, "rb") as f:
+            f.seek(max(start - segment_start, 0))
+            remaining = stop - max(start, segment_start)
+            while remaining > 0:
+                chunk = f.read(min(remaining, 1 << 20))
+                if not chunk:
+                    break
+                digest.update(chunk)
+                remaining -= len(chunk)
+    return digest
+
+
+def save_checkpoint(index, block_hash, offset, next_offset, prefix=None):
+    """Store the last verified block and digests of every chain byte before next_offset.
+
+    Sealed segments are covered by the digests of their headers. The bytes of
+    the file holding next_offset are hashed from its start; prefix is the
+    (file start, digest, offset) validate_checkpoint left, extended over the
+    new bytes when the file is the same so the old ones are not read again.
+    """
+    checkpoint_path = get_data_path(CHECKPOINT_FILE)
+    tail_offset = get_file_start(next_offset)
+    if prefix is not None and prefix[0] == tail_offset:
+        tail_digest = hash_chain_range(prefix[2], next_offset, prefix[1])
+    else:
+        tail_digest = hash_chain_range(tail_offset, next_offset)
+    checkpoint = {
+        "index": index,
+        "hash": block_hash,
+        "offset": offset,
+        "next_offset": next_offset,
+        # Hashing the raw bytes is much cheaper than verifying the blocks again and
+        # catches edits that keep every length, which the offsets alone would miss
+        "segment_digests": [
+            segment["digest"] for segment in load_segments() if segment["start_offset"] < tail_offset
+        ],
+        "tail_offset": tail_offset,
+        "tail_digest": tail_digest.hexdigest(),
+    }
+    # Atomic replace so a crash never leaves a half written checkpoint
+    tmp_path = checkpoint_path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def clear_checkpoint():
+    checkpoint_path = get_data_path(CHECKPOINT_FILE)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+
+def validate_checkpoint(checkpoint):
+    """Check that the verified prefix of the chain is byte for byte the one checkpointed.
+
+    Returns the (file start, digest, offset) for save_checkpoint to extend,
+    None if the checkpoint no longer matches the chain.
+    """
+    offset = checkpoint["offset"]
+    next_offset = checkpoint["next_offset"]
+    if get_chain_size() < next_offset or "tail_digest" not in checkpoint:
+        return None
+    # An edit that changed lengths before the checkpoint leaves offset inside a line
+    if offset > 0 and read_chain_bytes(offset - 1, 1) != b"\n":
+        return None
+
+    try:
+        for _, record_end, block in iter_blockchain_records(offset):
+            if record_end != next_offset or block.get("hash") != checkpoint["hash"]:
+                return None
+            break
+        else:
+            return None
+    except ValueError:
+        return None
+
+    # Segments sealed before the checkpoint are trusted by their header digest, as --segments does
+    segment_digests = checkpoint["segment_digests"]
+    segments = load_segments()[: len(segment_digests)]
+    if [segment["digest"] for segment in segments] != segment_digests:
+        return None
+    sealed_end = segments[-1]["start_offset"] + segments[-1]["size"] if segments else 0
+    if sealed_end != checkpoint["tail_offset"]:
+        return None
+    tail_digest = hash_chain_range(sealed_end, next_offset)
+    if tail_digest.hexdigest() != checkpoint["tail_digest"]:
+        return None
+    return sealed_end, tail_digest, next_offset
+
+
+def check_block(block, index, previous_hash):
+    expected_hash = recalculate_hash(block, previous_hash)
+    stored_hash = block["hash"]
+    stored_prev_hash = block["prev_hash"]
+    errors = []
+
+    if stored_prev_hash != previous_hash:
+        errors.append(
+            {
+                "block_index": index,
+                "error": "Previous hash mismatch",
+                "expected_prev": previous_hash,
+                "stored_prev": stored_prev_hash,
+            }
+        )
+
+    if stored_hash != expected_hash:
+        errors.append(
+            {
+                "block_index": index,
+                "error": "Hash mismatch",
+                "expected_hash": expected_hash,
+                "stored_hash": stored_hash,
+            }
+        )
 
-    print(f"🔍 Verifying blockchain with {len(blockchain)} blocks...")
+    # The block hash covers the stored Merkle root, the root must cover the readings
+    if block.get("version") == MERKLE_HASH_VERSION:
+        expected_root = merkle_root(block["data"]["readings"])
+        if block["data"]["merkle_root"] != expected_root:
+            errors.append(
+                {
+                    "block_index": index,
+                    "error": "Merkle root mismatch",
+                    "expected_root": expected_root,
+                    "stored_root": block["data"]["merkle_root"],
+                }
+            )
+
+    return errors
+
+
+def verify_blocks(records, previous_hash, start_index):
     corrupted_blocks = []
+    last_record = None
+
+    for i, (offset, next_offset, block) in enumerate(records, start_index):
+        corrupted_blocks.extend(check_block(block, i, previous_hash))
+        previous_hash = block["hash"]
+        last_record = (i, previous_hash, offset, next_offset)
+
+    return corrupted_blocks, last_record
+
+
+def verify_byte_range(byte_range):
+    """Verify the blocks whose line starts inside [start, stop) of one segment file.
+
+    Offsets are chain offsets, segment_start is where the file begins. The
+    first block of the range is returned unchecked because its previous
+    hash lives in another range, the caller checks it while merging.
+    """
+    path, segment_start, start, stop = byte_range
+    result = {"count": 0, "first_block": None, "errors": [], "last_record": None}
+
+    with open(path, "rb") as f:
+        if start > segment_start:
+            # Skip the tail of a line that started in the previous range
+            f.seek(start - segment_start - 1)
+            f.readline()
+        offset = segment_start + f.tell()
+        previous_hash = None
+
+        while offset < stop:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                break
+            block = json.loads(line)
+            local_index = result["count"]
+
+            if local_index == 0:
+                result["first_block"] = block
+            else:
+                result["errors"].extend(check_block(block, local_index, previous_hash))
+
+            previous_hash = block["hash"]
+            result["count"] += 1
+            result["last_record"] = (local_index, previous_hash, offset, offset + len(line))
+            offset += len(line)
+
+    return result
+
+
+def split_byte_ranges(start_offset, range_count):
+    """(path, segment start, start, stop) ranges of about the same size, never across segments"""
+    chain_size = get_chain_size()
+    range_size = max(1, (chain_size - start_offset + range_count - 1) // range_count)
+    byte_ranges = []
+    for path, segment_start in iter_segment_files(start_offset):
+        segment_end = segment_start + os.path.getsize(path)
+        for start in range(max(start_offset, segment_start), segment_end, range_size):
+            byte_ranges.append((path, segment_start, start, min(start + range_size, segment_end)))
+    return byte_ranges
+
+
+def verify_blocks_parallel(start_offset, previous_hash, start_index, workers):
+    # A few ranges per worker so a slow range does not leave cores idle
+    byte_ranges = split_byte_ranges(start_offset, workers * 4)
+
+    corrupted_blocks = []
+    last_record = None
+    index = start_index
+
+    with Pool(workers) as pool:
+        for result in pool.imap(verify_byte_range, byte_ranges):
+            if result["count"] == 0:
+                continue
+
+            first_block = result["first_block"]
+            corrupted_blocks.extend(check_block(first_block, index, previous_hash))
+            for error in result["errors"]:
+                corrupted_blocks.append({**error, "block_index": index + error["block_index"]})
+
+            local_index, previous_hash, offset, next_offset = result["last_record"]
+            last_record = (index + local_index, previous_hash, offset, next_offset)
+            index += result["count"]
+
+    return corrupted_blocks, last_record
+
+
+def hash_segment(segment):
+    digest = hashlib.sha256()
+    with open(get_segment_path(segment["segment"]), "rb") as f:
+        while True:
+            chunk = f.read(1 << 20)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def verify_sealed_segments(workers=1):
+    """Check the sealed segments against their headers without recalculating block hashes.
+
+    A segment is trusted when its digest matches and its boundary hashes link
+    to the previous segment. Returns the errors and the (index, hash, offset)
+    where verification of the active segment starts.
+    """
+    segments = load_segments()
+    errors = []
     previous_hash = "0"
+    next_index = 0
 
-    for i, block in enumerate(blockchain):
-        expected_hash = recalculate_hash(block, previous_hash)
-        stored_hash = block["hash"]
-        stored_prev_hash = block["prev_hash"]
+    if workers > 1 and len(segments) > 1:
+        with Pool(workers) as pool:
+            digests = pool.map(hash_segment, segments)
+    else:
+        digests = [hash_segment(segment) for segment in segments]
 
-        if stored_prev_hash != previous_hash:
-            corrupted_blocks.append(
+    for segment, digest in zip(segments, digests):
+        if segment["first_prev_hash"] != previous_hash or segment["first_index"] != next_index:
+            errors.append(
                 {
-                    "block_index": i,
-                    "error": "Previous hash mismatch",
-                    "expected_prev": previous_hash,
-                    "stored_prev": stored_prev_hash,
+                    "block_index": segment["first_index"],
+                    "error": f"Segment {segment['segment']} does not link to the previous one",
                 }
             )
-
-        if stored_hash != expected_hash:
-            corrupted_blocks.append(
+        if digest != segment["digest"]:
+            errors.append(
                 {
-                    "block_index": i,
-                    "error": "Hash mismatch",
-                    "expected_hash": expected_hash,
-                    "stored_hash": stored_hash,
+                    "block_index": segment["first_index"],
+                    "error": f"Segment {segment['segment']} digest mismatch",
                 }
             )
+        previous_hash = segment["last_hash"]
+        next_index = segment["last_index"] + 1
+
+    active_start = segments[-1]["start_offset"] + segments[-1]["size"] if segments else 0
+    return errors, (next_index, previous_hash, active_start)
+
+
+def verify_blockchain_integrity(incremental=False, workers=1, segments=False):
+    start_index = 0
+    start_offset = 0
+    previous_hash = "0"
+    corrupted_blocks = []
 
-        previous_hash = stored_hash
+    if segments:
+        corrupted_blocks, (start_index, previous_hash, start_offset) = verify_sealed_segments(
+            workers
+        )
+        if start_index > 0:
+            print(f"🔒 {len(load_segments())} sealed segments checked by digest")
+
+    prefix = None
+    if incremental:
+        checkpoint = load_checkpoint()
+        if checkpoint is not None:
+            prefix = validate_checkpoint(checkpoint)
+        if prefix is not None:
+            start_index = checkpoint["index"] + 1
+            start_offset = checkpoint["next_offset"]
+            previous_hash = checkpoint["hash"]
+        elif checkpoint is not None:
+            print("⚠️  Checkpoint no longer matches the chain - running full verification")
+            clear_checkpoint()
+
+    total_blocks = count_blocks() - start_index
+
+    if start_index > 0:
+        if total_blocks == 0 and not corrupted_blocks:
+            print(f"✅ No new blocks since block #{start_index - 1}")
+            return True
+        print(f"🔍 Verifying {total_blocks} new blocks since block #{start_index - 1}...")
+    else:
+        if total_blocks == 0:
+            print("✅ Blockchain is empty - no corruption possible")
+            return True
+        print(f"🔍 Verifying blockchain with {total_blocks} blocks...")
+
+    if workers > 1:
+        range_errors, last_record = verify_blocks_parallel(
+            start_offset, previous_hash, start_index, workers
+        )
+    else:
+        range_errors, last_record = verify_blocks(
+            iter_blockchain_records(start_offset), previous_hash, start_index
+        )
+    corrupted_blocks.extend(range_errors)
 
     if len(corrupted_blocks) == 0:
+        if last_record is not None:
+            save_checkpoint(*last_record, prefix)
         print("✅ Blockchain integrity verified - no corruption detected")
         return True
     else:
@@ -58,34 +388,54 @@ def verify_blockchain_integrity():
         return False
 
 
-def generate_report():
-    blockchain = load_blockchain()
-    if blockchain is None:
-        return
+SIGNALS = [
+    ("frequency", "Frequency (bpm)"),
+    ("systolic", "Systolic (mmHg)"),
+    ("diastolic", "Diastolic (mmHg)"),
+    ("oxygen", "Oxygen (%)"),
+]
+
+
+# Hours listed in the report, the most recent ones
+REPORT_HOURS = 24
 
-    total_blocks = len(blockchain)
-    alert_blocks = sum(1 for block in blockchain if block.get("alert", False))
 
+def format_hours(content, pending):
+    """Per hour readings, mean of every signal and alerts, from the hour rollups"""
+    hours = {}
+    for (_, start, signal), bucket in load_rollups("hour", pending=pending, content=content).items():
+        hours.setdefault(start, {})[signal] = describe_bucket(bucket)
+
+    lines = ""
+    for start in sorted(hours)[-REPORT_HOURS:]:
+        hour = hours[start]
+        means = ", ".join(f"{signal} {hour[signal]['mean']:.1f}" for signal, _ in SIGNALS)
+        alerts = sum(hour[signal]["alerts"] for signal, _ in SIGNALS)
+        lines += (
+            f"- {format_timestamp(start * 1_000_000_000)[:16]}: "
+            f"{hour['frequency']['count']} readings, {means}, alerts {alerts}\n"
+        )
+    return lines
+
+
+def generate_report():
+    # Answered from the rollups in O(buckets). The blocks the verifier has not
+    # flushed yet are aggregated in memory: the report never writes the rollups
+    content, pending = read_rollups()
+    totals = summarize_rollups(pending=pending, content=content)
+    totals = {signal: describe_bucket(bucket) for signal, bucket in totals.items()}
+
+    total_blocks = totals["block"]["count"]
+    alert_blocks = totals["block"]["alerts"]
     if total_blocks == 0:
         print("📊 No blocks to analyze for report")
         return
 
-    frequency_values = []
-    systolic_values = []
-    diastolic_values = []
-    oxygen_values = []
-
-    for block in blockchain:
-        data = block["data"]
-        frequency_values.append(data["frequency"]["mean"])
-        systolic_values.append(data["pressure"]["mean"][0])
-        diastolic_values.append(data["pressure"]["mean"][1])
-        oxygen_values.append(data["oxygen"]["mean"])
-
-    avg_frequency = sum(frequency_values) / len(frequency_values)
-    avg_systolic = sum(systolic_values) / len(systolic_values)
-    avg_diastolic = sum(diastolic_values) / len(diastolic_values)
-    avg_oxygen = sum(oxygen_values) / len(oxygen_values)
+    total_readings = totals["frequency"]["count"]
+    avg_frequency = totals["frequency"]["mean"]
+    avg_systolic = totals["systolic"]["mean"]
+    avg_diastolic = totals["diastolic"]["mean"]
+    avg_oxygen = totals["oxygen"]["mean"]
 
     report_content = f"""BLOCKCHAIN ANALYSIS REPORT
 {"=" * 50}
@@ -103,6 +453,15 @@ ANALYSIS:
 
 """
 
+    report_content += f"STATISTICS:\n- Total readings: {total_readings}\n"
+    for signal, label in SIGNALS:
+        signal_stats = totals[signal]
+        report_content += (
+            f"- {label}: min {signal_stats['min']:.1f}, max {signal_stats['max']:.1f}, "
+            f"std dev {signal_stats['std_dev']:.1f}, alerts {signal_stats['alerts']}\n"
+        )
+    report_content += f"\nHOURLY AVERAGES (last {REPORT_HOURS} hours):\n" + format_hours(content, pending) + "\n"
+
     base_path = os.path.dirname(__file__)
 
     with open(os.path.join(base_path, "report.txt"), "w") as f:
@@ -112,10 +471,37 @@ ANALYSIS:
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Verify the blockchain and generate the report")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only verify the blocks appended since the last checkpoint",
+    )
+    mode.add_argument(
+        "--full",
+        action="store_true",
+        help="verify the whole chain from the genesis block (default)",
+    )
+    mode.add_argument(
+        "--segments",
+        action="store_true",
+        help="trust sealed segments whose digest matches their header, only verify the active one",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="number of processes used to recalculate the hashes",
+    )
+    args = parser.parse_args()
+
     print("BLOCKCHAIN VERIFICATION")
     print("=" * 40)
 
-    integrity_ok = verify_blockchain_integrity()
+    integrity_ok = verify_blockchain_integrity(
+        incremental=args.incremental, workers=args.workers, segments=args.segments
+    )
 
     generate_report()
 